@@ -1 +1,2 @@
 from .core import *
+from .single_flight import SingleFlight
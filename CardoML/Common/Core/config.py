@@ -1,2 +1,3 @@
 LOCK_ATTRIBUTE = "lock"
 DATA_ATTRIBUTE = "data"
+STORAGE_LEVEL_ATTRIBUTE = "storage_level"
@@ -1,44 +1,208 @@
 import asyncio
 import functools
+import warnings
 from threading import Lock
-from typing import Any, Callable, Generator, List, Union, Tuple
+from typing import Any, Callable, Generator, Hashable, List, Union, Tuple
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyspark.sql.functions as F
 from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
 from CardoExecutor.Contract.CardoContextBase import CardoContextBase
 from CardoExecutor.Contract.IStep import IStep
 from CardoLibs.IO import HiveWriter, HiveReader
+from pandas.api.types import is_bool_dtype, is_numeric_dtype, is_object_dtype, is_string_dtype, union_categoricals
+from pandas.core.dtypes.cast import find_common_type
+from pyspark import RDD
+from pyspark.sql import DataFrame as SparkDataFrame, SparkSession
+from pyspark.sql.pandas.types import to_arrow_schema
+from pyspark.sql.types import StringType, StructField, StructType
 from pyspark.sql.catalog import Catalog
 
-from .config import LOCK_ATTRIBUTE, DATA_ATTRIBUTE
+from .config import LOCK_ATTRIBUTE, DATA_ATTRIBUTE, STORAGE_LEVEL_ATTRIBUTE
+from .memo import Memo, arguments_key
 
+TIME_ZONE_CONF = 'spark.sql.session.timeZone'
 
-def union_dataframes(*dataframes: Union[CardoDataFrame, List[CardoDataFrame], Tuple[CardoDataFrame]]):
+
+def union_dataframes(*dataframes: Union[CardoDataFrame, List[CardoDataFrame], Tuple[CardoDataFrame]],
+                     allow_missing_columns: bool = False, rdd_threshold: int = None):
     """
+    Spark dataframes are matched by column name (in the order of the first dataframe) and unioned as a balanced
+    tree, so the plan depth and the analysis time grow with log(n) instead of n.
+    Pandas dataframes are concatenated in one call without copying, after aligning the dtypes of their columns
+    (categories are unioned, numbers are cast to their common type) so nothing is upcast to object.
+    When spark and pandas dataframes are mixed, the smaller side is converted through arrow.
     :param dataframes:
+    :param allow_missing_columns: union all the columns of all the dataframes, filling the missing ones with nulls.
+        otherwise every dataframe must have the columns of the first one, and extra columns are dropped
+    :param rdd_threshold: union at the rdd level (one n-ary union, no plan to analyze) when there are at least that
+        many spark dataframes. the rows go through python, so it only pays off for a lot of small dataframes
     :return: union of all those dataframes
     """
     if isinstance(dataframes[0], list) or isinstance(dataframes[0], tuple):
-        return union_dataframes(*[dataframe for many_dataframe in dataframes for dataframe in many_dataframe])
+        return union_dataframes(*[dataframe for many_dataframe in dataframes for dataframe in many_dataframe],
+                                allow_missing_columns=allow_missing_columns, rdd_threshold=rdd_threshold)
 
     else:
+        is_pandas = {dataframe.payload_type == 'pandas' for dataframe in dataframes}
+        if len(is_pandas) > 1:
+            return union_dataframes(*__convert_smaller_side(dataframes),
+                                    allow_missing_columns=allow_missing_columns, rdd_threshold=rdd_threshold)
         if dataframes[0].payload_type in ['dataframe', 'rdd']:
-            unioned = functools.reduce(
-                lambda df1, df2: CardoDataFrame(df1.dataframe.union(df2.dataframe.select(df1.dataframe.columns))),
-                dataframes)
-            return unioned
+            aligned = __align_columns([dataframe.dataframe for dataframe in dataframes], allow_missing_columns)
+            if rdd_threshold is not None and len(aligned) >= rdd_threshold:
+                spark = SparkSession.builder.getOrCreate()
+                schema = StructType([StructField(field.name, field.dataType, True) for field in aligned[0].schema])
+                return CardoDataFrame(spark.createDataFrame(spark.sparkContext.union([df.rdd for df in aligned]),
+                                                            schema))
+            return CardoDataFrame(__balanced_union(aligned))
         if dataframes[0].payload_type == 'pandas':
-            unioned = pd.concat(dataframes, axis=0)
-            return unioned
+            frames = [dataframe.dataframe for dataframe in dataframes]
+            if not allow_missing_columns:
+                columns = list(frames[0].columns)
+                frames = [frame if list(frame.columns) == columns else frame[columns] for frame in frames]
+            unioned = pd.concat(__align_pandas_dtypes(frames), axis=0, copy=False)
+            return CardoDataFrame(unioned)
+
+
+def __align_columns(dataframes: List[SparkDataFrame], allow_missing_columns: bool) -> List[SparkDataFrame]:
+    if not allow_missing_columns:
+        columns = dataframes[0].columns
+        return [df if df.columns == columns else df.select(columns) for df in dataframes]
+    fields = {}
+    for df in dataframes:
+        for field in df.schema.fields:
+            fields.setdefault(field.name, field.dataType)
+    return [df if df.columns == list(fields) else
+            df.select([F.col(name) if name in df.columns else F.lit(None).cast(data_type).alias(name)
+                       for name, data_type in fields.items()])
+            for df in dataframes]
+
+
+def __align_pandas_dtypes(frames: List[pd.DataFrame]) -> List[pd.DataFrame]:
+    dtypes = {}
+    for frame in frames:
+        for column, dtype in frame.dtypes.items():
+            dtypes.setdefault(column, []).append(dtype)
+
+    common_dtypes = {}
+    for column, column_dtypes in dtypes.items():
+        if all(isinstance(dtype, pd.CategoricalDtype) for dtype in column_dtypes):
+            categories = union_categoricals([pd.Categorical([], categories=dtype.categories)
+                                             for dtype in column_dtypes], ignore_order=True).categories
+            common_dtypes[column] = pd.CategoricalDtype(categories, ordered=column_dtypes[0].ordered)
+        elif all(is_numeric_dtype(dtype) and not is_bool_dtype(dtype) for dtype in column_dtypes):
+            common_dtype = find_common_type(column_dtypes)  # handles the nullable extension dtypes (ex: Int64)
+            if common_dtype != np.dtype(object):
+                common_dtypes[column] = common_dtype
+
+    aligned = []
+    for frame in frames:
+        to_cast = {column: dtype for column, dtype in common_dtypes.items()
+                   if column in frame.columns and frame[column].dtype != dtype}
+        aligned.append(frame.astype(to_cast, copy=False) if to_cast else frame)
+    return aligned
+
+
+def __convert_smaller_side(dataframes: List[CardoDataFrame]) -> List[CardoDataFrame]:
+    """
+    convert the pandas dataframes to spark or the spark dataframes to pandas, whichever is smaller, through arrow
+    """
+    pandas_bytes = sum(dataframe.dataframe.memory_usage(index=True).sum()
+                       for dataframe in dataframes if dataframe.payload_type == 'pandas')
+    spark_bytes = sum(int(dataframe.dataframe._jdf.queryExecution().optimizedPlan().stats().sizeInBytes().toString())
+                      for dataframe in dataframes if dataframe.payload_type != 'pandas')
+    spark = SparkSession.builder.getOrCreate()
+    if pandas_bytes <= spark_bytes:
+        return [CardoDataFrame(pandas_to_spark(dataframe.dataframe, spark), dataframe.table_name)
+                if dataframe.payload_type == 'pandas' else dataframe for dataframe in dataframes]
+    return [CardoDataFrame(spark_to_pandas(dataframe.dataframe), dataframe.table_name)
+            if dataframe.payload_type != 'pandas' else dataframe for dataframe in dataframes]
+
+
+def pandas_to_spark(df: pd.DataFrame, spark: SparkSession = None) -> SparkDataFrame:
+    """
+    Create a spark dataframe from a pandas dataframe through arrow, without setting the session wide arrow conf
+    (workflows that run concurrently share it). falls back to the row by row conversion like spark does.
+    """
+    spark = spark or SparkSession.builder.getOrCreate()
+    try:
+        return spark._create_from_pandas_with_arrow(df, None, spark.conf.get(TIME_ZONE_CONF))
+    except Exception as e:
+        warnings.warn('arrow conversion failed, converting row by row: {}'.format(e))
+        return spark.createDataFrame(df)
+
+
+def spark_to_pandas(df: Union[SparkDataFrame, RDD]) -> pd.DataFrame:
+    """
+    Collect a spark dataframe to pandas through arrow, without setting the session wide arrow conf
+    """
+    df = df if isinstance(df, SparkDataFrame) else df.toDF()
+    return pa.Table.from_batches(df._collect_as_arrow(), schema=to_arrow_schema(df.schema)).to_pandas()
 
 
-def generic_fillna(df: pd.DataFrame, fill_zeros: bool=True, value: Any=np.nan, *args, **kwargs) -> pd.DataFrame:
-    default_fill = {None: np.nan, 'nan': np.nan, 'None': np.nan, 'none': np.nan,
-                    'Nan': np.nan, 'NAN': np.nan, '': np.nan}
+def __balanced_union(dataframes: List[SparkDataFrame]) -> SparkDataFrame:
+    while len(dataframes) > 1:
+        dataframes = [dataframes[i].union(dataframes[i + 1]) if i + 1 < len(dataframes) else dataframes[i]
+                      for i in range(0, len(dataframes), 2)]
+    return dataframes[0]
+
+
+def generic_fillna(df: Union[pd.DataFrame, SparkDataFrame, CardoDataFrame], fill_zeros: bool=True, value: Any=np.nan,
+                   *args, inplace: bool=False, **kwargs) -> Union[pd.DataFrame, SparkDataFrame, CardoDataFrame]:
+    """
+    Replace the strings that mean null ('nan', 'None', '', ... and '0' if fill_zeros) with nulls, then fillna.
+    Only object, string and categorical columns are scanned, with one vectorized membership test per column
+    (categoricals just drop those categories). A spark dataframe is handled by `spark_generic_fillna`, and a
+    CardoDataFrame by the function of its payload (it isn't converted).
+    :param inplace: change df itself instead of a shallow copy of it
+    """
+    if isinstance(df, CardoDataFrame):
+        return CardoDataFrame(generic_fillna(df.dataframe, fill_zeros, value, *args, inplace=inplace, **kwargs),
+                              df.table_name)
+    if isinstance(df, SparkDataFrame):
+        return spark_generic_fillna(df, fill_zeros, None if __is_nan(value) else value)
+    null_strings = __null_strings(fill_zeros)
+    result = df if inplace else df.copy(deep=False)
+    for col_name, col in df.items():
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            nulls = [category for category in col.cat.categories if category in null_strings]
+            if nulls:
+                result[col_name] = col.cat.remove_categories(nulls)
+        elif is_object_dtype(col.dtype) or is_string_dtype(col.dtype):
+            is_null = col.isin(null_strings + [None])
+            if is_null.any():
+                result[col_name] = col.mask(is_null)
+    if args or kwargs or not __is_nan(value):
+        if inplace:
+            result.fillna(*args, value=value, inplace=True, **kwargs)
+        else:
+            result = result.fillna(*args, value=value, **kwargs)
+    return result
+
+
+def spark_generic_fillna(df: SparkDataFrame, fill_zeros: bool=True, value: Any=None) -> SparkDataFrame:
+    """
+    Same as `generic_fillna` for a spark dataframe, so the nulls can be normalized before `toPandas`.
+    """
+    null_strings = __null_strings(fill_zeros)
+    df = df.select([F.when(F.col(field.name).isin(null_strings), F.lit(None)).otherwise(F.col(field.name))
+                    .alias(field.name) if isinstance(field.dataType, StringType) else F.col(field.name)
+                    for field in df.schema.fields])
+    return df if value is None else df.fillna(value)
+
+
+def __null_strings(fill_zeros: bool) -> List[str]:
+    null_strings = ['nan', 'None', 'none', 'Nan', 'NAN', '']
     if fill_zeros:
-        default_fill.update({'0': np.nan})
-    return df.replace(default_fill).fillna(*args, value=value, **kwargs)
+        null_strings.append('0')
+    return null_strings
+
+
+def __is_nan(value: Any) -> bool:
+    return isinstance(value, float) and np.isnan(value)
 
 
 def get_all_subclasses(cls) -> Generator[Callable, Any, None]:
@@ -52,6 +216,9 @@ def get_all_subclasses(cls) -> Generator[Callable, Any, None]:
             yield b_class
 
 
+__creation_lock = Lock()
+
+
 def lock(lock_attribute: str=LOCK_ATTRIBUTE) -> Callable:
     """
     Add a lock mechanism to the class if its not already exists.
@@ -60,38 +227,107 @@ def lock(lock_attribute: str=LOCK_ATTRIBUTE) -> Callable:
     def wrapper(func: Callable):
         @functools.wraps(func)
         def inner(self, *args, **kwargs):
-            if not hasattr(self, lock_attribute):
-                setattr(self, lock_attribute, Lock())
-            with getattr(self, lock_attribute):
+            with get_lock(self, lock_attribute):
                 return func(self, *args, **kwargs)
         return inner
     return wrapper
 
 
-def register(attribute_name: str=DATA_ATTRIBUTE) -> Callable:
+def get_lock(instance: Any, lock_attribute: str=LOCK_ATTRIBUTE) -> Lock:
     """
-    Assign the return value of a function into the attribute_name attribute of a class if it doesn't exist already.
-    Return the assigned value whenever the function is called again.
-    If the attribute_name already exists it will just return it.
+    :return: the lock of the instance, created once even when several threads ask for it at the same time
+    """
+    instance_lock = getattr(instance, lock_attribute, None)
+    if instance_lock is None:
+        with __creation_lock:
+            instance_lock = getattr(instance, lock_attribute, None)
+            if instance_lock is None:
+                instance_lock = Lock()
+                setattr(instance, lock_attribute, instance_lock)
+    return instance_lock
+
+
+def register(attribute_name: str=DATA_ATTRIBUTE, max_entries: int=None, ttl: float=None) -> Callable:
+    """
+    Memoize the return values of a function in a Memo under the attribute_name attribute of a class,
+    keyed by the arguments (see `arguments_key`): calling it again with the same arguments returns the stored value,
+    calling it with other arguments computes and stores another value.
+    Concurrent callers with the same arguments wait for a single computation (and all get its error if it fails,
+    the next call computes again), callers with different arguments don't wait for each other.
+    Works for coroutine functions as well.
+    :param max_entries: keep at most that many values, drop the least recently used ones
+    :param ttl: values older than that many seconds are computed again
     """
     def wrapper(func: Callable):
+        def compute(memo: Memo, key: Hashable, self, *args, **kwargs):
+            hit, value = memo.get(key)
+            if not hit:
+                value = func(self, *args, **kwargs)
+                memo.put(key, value, args)
+            return value
+
+        async def compute_async(memo: Memo, key: Hashable, self, *args, **kwargs):
+            hit, value = memo.get(key)
+            if not hit:
+                value = await func(self, *args, **kwargs)
+                memo.put(key, value, args)
+            return value
+
         @functools.wraps(func)
         def inner(self, *args, **kwargs):
-            if not hasattr(self, attribute_name):
-                setattr(self, attribute_name, func(self, *args, **kwargs))
-            return getattr(self, attribute_name)
-        return inner
+            memo = __get_memo(self, attribute_name, max_entries, ttl)
+            key = arguments_key(args, kwargs)
+            hit, value = memo.get(key)
+            if hit:
+                return value
+            return memo.single_flight.do(key, compute, memo, key, self, *args, **kwargs)
+
+        @functools.wraps(func)
+        async def async_inner(self, *args, **kwargs):
+            memo = __get_memo(self, attribute_name, max_entries, ttl)
+            key = arguments_key(args, kwargs)
+            hit, value = memo.get(key)
+            if hit:
+                return value
+            return await memo.single_flight.do_async(key, compute_async, memo, key, self, *args, **kwargs)
+
+        return async_inner if asyncio.iscoroutinefunction(func) else inner
     return wrapper
 
 
+def invalidate(instance: Any, *args, attribute_name: str=DATA_ATTRIBUTE, **kwargs) -> None:
+    """
+    Drop the value `register` stored for these arguments, or all the stored values if no arguments are given
+    """
+    memo = getattr(instance, attribute_name, None)
+    if memo is not None:
+        memo.invalidate(arguments_key(args, kwargs) if args or kwargs else None)
+
+
+def __get_memo(instance: Any, attribute_name: str, max_entries: int, ttl: float) -> Memo:
+    memo = getattr(instance, attribute_name, None)
+    if memo is None:
+        with __creation_lock:
+            memo = getattr(instance, attribute_name, None)
+            if memo is None:
+                memo = Memo(max_entries, ttl)
+                setattr(instance, attribute_name, memo)
+    return memo
+
+
 def persist(func: Callable) -> Callable:
     """
     :param func: any process function that have CardoContext input and returns CardoDataFrame
-    :return: persisted CardoDataFrame
+    :return: persisted CardoDataFrame, with the `storage_level` of the class if it has one
     """
     @functools.wraps(func)
     def inner(self, cardo_context: CardoContextBase, *args, **kwargs):
-        return func(self, cardo_context, *args, **kwargs).persist()
+        result = func(self, cardo_context, *args, **kwargs)
+        storage_level = getattr(self, STORAGE_LEVEL_ATTRIBUTE, None)
+        if storage_level is None or result.payload_type not in ['dataframe', 'rdd']:
+            return result.persist()
+        result.dataframe = result.dataframe.persist(storage_level)
+        return result
     return inner
 
 
@@ -136,6 +372,8 @@ def chunker(values: List, chunksize: int) -> Generator[List, Any, None]:
 
 def reuse_last_run(full_table_name: str) -> Callable:
     """
+    Deprecated, use `CardoML.Common.StepCache.step_cache` which doesn't scan the input to find what changed.
+
     Usage Examples:
         1)
         class ExampleStep(IStep):
@@ -158,6 +396,8 @@ def reuse_last_run(full_table_name: str) -> Callable:
 
     :param full_table_name: the name of the hive schema and table in this format: "schema.table"
     """
+    warnings.warn("reuse_last_run is deprecated, use CardoML.Common.StepCache.step_cache instead",
+                  DeprecationWarning, stacklevel=2)
     schema_name, table_name = full_table_name.split('.')
 
     def wrapper(func: Callable):
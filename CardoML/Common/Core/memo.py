@@ -0,0 +1,97 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Hashable, List, Tuple
+
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+
+from .single_flight import SingleFlight
+
+__all__ = ['Memo', 'arguments_key']
+
+
+class MemoEntry:
+    def __init__(self, value: Any, arguments: Tuple):
+        self.value = value
+        self.arguments = arguments  # keeps the arguments alive, so the ids in their key can't be reused
+        self.created = time.time()
+
+
+class Memo:
+    """
+    The results of a function by the key of its arguments (see `arguments_key`), least recently used first.
+    """
+    def __init__(self, max_entries: int = None, ttl: float = None):
+        """
+        :param max_entries: keep at most that many results, drop the least recently used ones
+        :param ttl: results older than that many seconds are computed again
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # type: Dict[Hashable, MemoEntry]
+        self.single_flight = SingleFlight()
+        self.lock = Lock()
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        :return: (whether the key has a valid result, the result)
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            if self.ttl is not None and time.time() - entry.created > self.ttl:
+                del self.entries[key]
+                return False, None
+            self.entries.move_to_end(key)
+            return True, entry.value
+
+    def put(self, key: Hashable, value: Any, arguments: Tuple = ()) -> List[Any]:
+        """
+        :return: the values that were dropped to keep max_entries
+        """
+        with self.lock:
+            self.entries[key] = MemoEntry(value, arguments)
+            self.entries.move_to_end(key)
+            dropped = []
+            while self.max_entries is not None and len(self.entries) > self.max_entries:
+                dropped.append(self.entries.popitem(last=False)[1].value)
+            return dropped
+
+    def invalidate(self, key: Hashable = None) -> None:
+        """
+        Drop the result of key, or all the results if no key is given
+        """
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key)[0]
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.entries)
+
+
+def arguments_key(args: Tuple, kwargs: Dict[str, Any]) -> Hashable:
+    """
+    A stable key of function arguments. a spark CardoDataFrame is identified by its table name and the semantic hash
+    of its plan (so the same plan built twice gets the same key), any other unhashable argument by its identity.
+    """
+    return (tuple(__argument_key(arg) for arg in args),
+            tuple(sorted((name, __argument_key(value)) for name, value in kwargs.items())))
+
+
+def __argument_key(arg: Any) -> Hashable:
+    if isinstance(arg, CardoDataFrame):
+        if arg.payload_type in ['dataframe', 'rdd'] and hasattr(arg.dataframe, 'semanticHash'):
+            return CardoDataFrame.__name__, arg.table_name, arg.dataframe.semanticHash()
+        return CardoDataFrame.__name__, arg.table_name, id(arg.dataframe)
+    try:
+        hash(arg)
+        return arg
+    except TypeError:
+        return type(arg).__name__, id(arg)
@@ -0,0 +1,63 @@
+import asyncio
+from concurrent.futures import Future
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+__all__ = ['SingleFlight']
+
+
+class SingleFlight:
+    """
+    Run a computation once for all the callers that ask for the same key at the same time.
+    The first caller computes, the others wait on its future (no mutex is held while computing).
+    A failure is raised to all the waiting callers and forgotten, so the next call computes again.
+    """
+    def __init__(self):
+        self.futures = {}  # type: Dict[Hashable, Future]
+        self.lock = Lock()
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        future, is_leader = self.__join(key)
+        if not is_leader:
+            return future.result()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self.__resolve(key, future, exception=e)
+            raise
+        self.__resolve(key, future, result=result)
+        return result
+
+    async def do_async(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """
+        Same as `do` for asyncio callers, func may be a coroutine function. waiting doesn't block the event loop,
+        and asyncio callers share the computation with the threads that call `do` with the same key.
+        """
+        future, is_leader = self.__join(key)
+        if not is_leader:
+            return await asyncio.wrap_future(future)
+        try:
+            if asyncio.iscoroutinefunction(func):
+                result = await func(*args, **kwargs)
+            else:
+                result = func(*args, **kwargs)
+        except BaseException as e:
+            self.__resolve(key, future, exception=e)
+            raise
+        self.__resolve(key, future, result=result)
+        return result
+
+    def __join(self, key: Hashable) -> Tuple[Future, bool]:
+        with self.lock:
+            if key in self.futures:
+                return self.futures[key], False
+            future = self.futures[key] = Future()
+            return future, True
+
+    def __resolve(self, key: Hashable, future: Future, result: Any = None, exception: BaseException = None) -> None:
+        with self.lock:
+            del self.futures[key]
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
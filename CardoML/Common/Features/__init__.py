@@ -1,2 +1,9 @@
 from .feature_engineering import show,str_to_cats,apply_cats,cats_to_codes
-from .visualization import feature_similarity, find_outliers, describe_col, compare_labeled_data,heatmap
\ No newline at end of file
+from .visualization import feature_similarity, find_outliers, describe_col, compare_labeled_data,heatmap,collect_figures
+from .visualization import plot_feature_similarity, plot_col_description, plot_outliers, plot_heatmap
+from .conversion import to_pandas, to_spark, iter_pandas_batches, iter_arrow_batches, accepts_cardo_dataframe
+from .categorical_encoder import CategoricalEncoder
+from .streaming import StreamingFeatures, iter_parquet_chunks
+from .summaries import sample, reservoir_sample, rank_correlation, correlation, histogram, moments, quantile_summaries
+from .summaries import outlier_box_stats
+from .report import FeatureReport, render_task
@@ -0,0 +1,169 @@
+import json
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyspark.sql.functions as F
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from pandas.api.types import is_string_dtype
+from pyspark.sql import DataFrame as SparkDataFrame, SparkSession
+from pyspark.sql.types import IntegerType, StringType
+from pyspark.sql.window import Window
+
+COLUMN = 'column'
+CATEGORY = 'category'
+COUNT = 'count'
+DTYPES_METADATA = b'cardo_dtypes'
+
+
+class CategoricalEncoder:
+    """
+    Learn the categories of columns once (`fit`) and apply the same categories to any dataframe (`transform`), so
+    the codes of the training data and of the scored data match.
+
+        encoder = CategoricalEncoder(max_categories=1000).fit(train)
+        encoder.save('encoder.parquet')
+        scored = CategoricalEncoder.load('encoder.parquet').transform_codes(data)
+
+    Codes follow `cats_to_codes`: 0 for nulls and values that are not in the categories, i + 1 for the i-th category.
+    """
+    def __init__(self, columns: List[str] = None, max_categories: int = None):
+        """
+        :param columns: the columns to encode, by default the string and categorical columns of the fitted data
+        :param max_categories: keep only the most frequent categories of every column
+        """
+        self.columns = columns
+        self.max_categories = max_categories
+        self.categories = {}  # type: Dict[str, pd.Index]
+        self.counts = {}  # type: Dict[str, pd.Series]
+
+    def fit(self, data: Union[pd.DataFrame, SparkDataFrame, CardoDataFrame]) -> 'CategoricalEncoder':
+        df = data.dataframe if isinstance(data, CardoDataFrame) else data
+        self.counts = {}
+        if isinstance(df, SparkDataFrame):
+            self.categories = self.__fit_spark(df)
+            return self
+        self.categories = {}
+        return self.partial_fit(df)
+
+    def partial_fit(self, df: pd.DataFrame) -> 'CategoricalEncoder':
+        """
+        Add the values of another chunk of the data, the categories are the top ones of all the chunks so far
+        """
+        columns = self.columns or [col_name for col_name, col in df.items()
+                                   if is_string_dtype(col) or isinstance(col.dtype, pd.CategoricalDtype)]
+        for col_name in columns:
+            counts = df[col_name].value_counts(sort=False)
+            counts = pd.Series(counts.to_numpy(), index=pd.Index(counts.index.to_numpy()))
+            if col_name in self.counts:
+                counts = self.counts[col_name].add(counts, fill_value=0)
+            self.counts[col_name] = counts
+            self.categories[col_name] = self.__top_categories(counts)
+        return self
+
+    def transform(self, df: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
+        """
+        :return: the encoded columns as ordered categoricals with the fitted categories
+        """
+        result = df if inplace else df.copy(deep=False)
+        for col_name, categories in self.categories.items():
+            if col_name in df.columns:
+                result[col_name] = pd.Categorical.from_codes(self.__codes(df[col_name], categories),
+                                                             categories=categories, ordered=True)
+        return result
+
+    def transform_codes(self, df: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
+        """
+        :return: the encoded columns as ints, in the smallest int type that fits the categories
+        """
+        result = df if inplace else df.copy(deep=False)
+        for col_name, categories in self.categories.items():
+            if col_name in df.columns:
+                codes = self.__codes(df[col_name], categories) + 1
+                result[col_name] = codes.astype(np.min_scalar_type(-(len(categories) + 1)), copy=False)
+        return result
+
+    def transform_spark(self, df: SparkDataFrame) -> SparkDataFrame:
+        """
+        Same as `transform_codes` for a spark dataframe. the categories are broadcast once, and every batch is encoded
+        with one vectorized lookup.
+        """
+        vocabularies = SparkSession.builder.getOrCreate().sparkContext.broadcast(
+            {col_name: categories for col_name, categories in self.categories.items() if col_name in df.columns})
+
+        def encoder(col_name: str):
+            @F.pandas_udf(IntegerType())
+            def encode(values: pd.Series) -> pd.Series:
+                return pd.Series(vocabularies.value[col_name].get_indexer(values) + 1, dtype='int32')
+            return encode
+
+        return df.select([encoder(col_name)(self.__spark_values(col_name)).alias(col_name)
+                          if col_name in vocabularies.value else F.col(col_name) for col_name in df.columns])
+
+    def save(self, path: str) -> None:
+        """
+        Save the categories as one parquet file of one row, a list column per encoded column that keeps the arrow
+        type of its categories
+        """
+        table = pa.table({col_name: pa.ListArray.from_arrays(pa.array([0, len(categories)], pa.int32()),
+                                                             pa.array(categories.to_numpy()))
+                          for col_name, categories in self.categories.items()})
+        dtypes = {col_name: str(categories.dtype) for col_name, categories in self.categories.items()}
+        table = table.replace_schema_metadata({DTYPES_METADATA: json.dumps(dtypes).encode('utf-8')})
+        pq.write_table(table, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'CategoricalEncoder':
+        table = pq.read_table(path)
+        dtypes = json.loads(table.schema.metadata[DTYPES_METADATA].decode('utf-8'))
+        encoder = cls(columns=list(dtypes))
+        for col_name, dtype in dtypes.items():
+            categories = table.column(col_name).combine_chunks().flatten()
+            encoder.categories[col_name] = pd.Index(categories.to_numpy(zero_copy_only=False)).astype(dtype)
+        return encoder
+
+    def __top_categories(self, counts: pd.Series) -> pd.Index:
+        """
+        The max_categories most frequent values (ties broken by value), sorted like `str_to_cats` sorts them
+        """
+        counts = counts[counts > 0]  # categories of a categorical column that don't appear
+        if self.max_categories is not None and len(counts) > self.max_categories:
+            counts = counts.sort_index(kind='mergesort').sort_values(ascending=False, kind='mergesort')
+            counts = counts.iloc[:self.max_categories]
+        return counts.index.sort_values()
+
+    def __fit_spark(self, df: SparkDataFrame) -> Dict[str, pd.Index]:
+        """
+        Count the values of all the columns in one job, and keep the top ones in spark. the values are compared as
+        strings.
+        """
+        columns = self.columns or [field.name for field in df.schema.fields if isinstance(field.dataType, StringType)]
+        values = [F.struct(F.lit(col_name).alias(COLUMN), F.col(col_name).cast(StringType()).alias(CATEGORY))
+                  for col_name in columns]
+        counts = df.select(F.explode(F.array(*values)).alias('value')) \
+            .select('value.*') \
+            .filter(F.col(CATEGORY).isNotNull()) \
+            .groupBy(COLUMN, CATEGORY).agg(F.count(F.lit(1)).alias(COUNT))
+        if self.max_categories is not None:
+            rank = F.row_number().over(Window.partitionBy(COLUMN).orderBy(F.col(COUNT).desc(), F.col(CATEGORY)))
+            counts = counts.withColumn('rank', rank).filter(F.col('rank') <= self.max_categories)
+        collected = counts.select(COLUMN, CATEGORY).toPandas()
+        return {col_name: pd.Index(collected.loc[collected[COLUMN] == col_name, CATEGORY].to_numpy()).sort_values()
+                for col_name in columns}
+
+    def __spark_values(self, col_name: str):
+        if self.categories[col_name].dtype == object:
+            return F.col(col_name).cast(StringType())
+        return F.col(col_name)
+
+    @staticmethod
+    def __codes(col: pd.Series, categories: pd.Index) -> np.ndarray:
+        """
+        The position of every value in categories (-1 if missing), a categorical column is mapped by its categories
+        """
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            mapping = np.append(categories.get_indexer(col.cat.categories), -1)  # the code -1 (null) stays -1
+            return mapping[col.cat.codes.to_numpy()]
+        return categories.get_indexer(col)
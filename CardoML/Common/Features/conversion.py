@@ -0,0 +1,149 @@
+import functools
+import inspect
+from typing import Callable, Iterator, List, Union
+
+import pandas as pd
+import pyarrow as pa
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from pyspark.sql import DataFrame as SparkDataFrame, SparkSession
+from pyspark.sql.pandas.types import to_arrow_schema
+from pyspark.sql.types import BinaryType, StructField, StructType
+
+from CardoML.Common.Core.core import pandas_to_spark
+
+BATCH_COLUMN = 'arrow_batch'
+
+Data = Union[pd.DataFrame, SparkDataFrame, CardoDataFrame]
+
+
+def iter_arrow_batches(df: SparkDataFrame, encode_strings: bool = True,
+                       prefetch_partitions: bool = False) -> Iterator[pa.Table]:
+    """
+    Stream a spark dataframe to the driver as arrow tables, one partition at a time: every partition is serialized
+    to an arrow ipc stream on the executors and fetched with toLocalIterator, so the driver holds one partition
+    instead of the whole dataframe, and no row goes through python objects.
+    All the tables have the arrow schema of df.schema, no matter which values a partition holds (ex: a partition
+    where a column is all null), so they can be concatenated.
+    :param encode_strings: dictionary encode the strings, so a column with few distinct values stays small until it
+        becomes a categorical
+    """
+    schema = to_arrow_schema(df.schema)
+    output_schema = StructType([StructField(BATCH_COLUMN, BinaryType(), False)])
+
+    def serialize(tables: Iterator[pa.Table]) -> bytes:
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for table in tables:
+                writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    if hasattr(df, 'mapInArrow'):  # spark >= 3.3, the batches stay in arrow
+        def serialize_batches(batches: Iterator[pa.RecordBatch]) -> Iterator[pa.RecordBatch]:
+            data = serialize(pa.Table.from_batches([batch]).cast(schema) for batch in batches)
+            yield pa.RecordBatch.from_arrays([pa.array([data], pa.binary())], [BATCH_COLUMN])
+
+        batches = df.mapInArrow(serialize_batches, output_schema)
+    else:
+        def serialize_frames(frames: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+            data = serialize(pa.Table.from_pandas(frame, schema=schema, preserve_index=False) for frame in frames)
+            yield pd.DataFrame({BATCH_COLUMN: [data]})
+
+        batches = df.mapInPandas(serialize_frames, output_schema)
+    for row in batches.toLocalIterator(prefetchPartitions=prefetch_partitions):
+        table = pa.ipc.open_stream(row[BATCH_COLUMN]).read_all()
+        yield __dictionary_encode(table) if encode_strings else table
+
+
+def iter_pandas_batches(data: Data, columns: List[str] = None, sample_fraction: float = None, max_rows: int = None,
+                        strings_to_categories: bool = True, seed: int = None) -> Iterator[pd.DataFrame]:
+    """
+    Same as `to_pandas`, a pandas dataframe for every partition
+    """
+    df = __prepare(data, columns, sample_fraction, max_rows, seed)
+    if isinstance(df, pd.DataFrame):
+        yield df
+        return
+    for table in iter_arrow_batches(df, strings_to_categories):
+        yield table.to_pandas(strings_to_categorical=strings_to_categories, split_blocks=True, self_destruct=True)
+
+
+def to_pandas(data: Data, columns: List[str] = None, sample_fraction: float = None, max_rows: int = None,
+              strings_to_categories: bool = True, seed: int = None) -> pd.DataFrame:
+    """
+    Bring a spark dataframe (or a CardoDataFrame of any payload) to pandas through arrow, streaming the partitions.
+    :param columns: transfer only these columns
+    :param sample_fraction: transfer a sample of the rows
+    :param max_rows: transfer at most that many rows
+    :param strings_to_categories: convert string columns straight to categoricals (with the categories of all the
+        partitions), instead of python strings
+    """
+    df = __prepare(data, columns, sample_fraction, max_rows, seed)
+    if isinstance(df, pd.DataFrame):
+        return df
+    tables = list(iter_arrow_batches(df, strings_to_categories))
+    if not tables:
+        return to_arrow_schema(df.schema).empty_table().to_pandas()
+    table = pa.concat_tables(tables)
+    del tables
+    return table.to_pandas(strings_to_categorical=strings_to_categories, split_blocks=True, self_destruct=True)
+
+
+def to_spark(df: Union[pd.DataFrame, CardoDataFrame], spark: SparkSession = None) -> SparkDataFrame:
+    """
+    Create a spark dataframe from a pandas dataframe through arrow
+    """
+    if isinstance(df, CardoDataFrame):
+        if df.payload_type != 'pandas':
+            return df.dataframe
+        df = df.dataframe
+    return pandas_to_spark(df, spark)
+
+
+def accepts_cardo_dataframe(*column_arguments: str) -> Callable:
+    """
+    Let a pandas helper get a CardoDataFrame or a spark dataframe as its first argument, converted by `to_pandas`.
+    :param column_arguments: the arguments that hold all the columns the helper uses, so only they are transferred
+    """
+    def wrapper(func: Callable):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def inner(data: Data, *args, **kwargs):
+            if isinstance(data, pd.DataFrame):
+                return func(data, *args, **kwargs)
+            columns = None
+            if column_arguments:
+                arguments = signature.bind(data, *args, **kwargs)
+                arguments.apply_defaults()
+                columns = list(dict.fromkeys(arguments.arguments[name] for name in column_arguments))
+            return func(to_pandas(data, columns=columns), *args, **kwargs)
+        return inner
+    return wrapper
+
+
+def __prepare(data: Data, columns: List[str], sample_fraction: float, max_rows: int,
+              seed: int) -> Union[pd.DataFrame, SparkDataFrame]:
+    """
+    Project and sample before anything is transferred
+    """
+    df = data.dataframe if isinstance(data, CardoDataFrame) else data
+    if isinstance(df, pd.DataFrame):
+        if columns is not None:
+            df = df[columns]
+        if sample_fraction is not None:
+            df = df.sample(frac=sample_fraction, random_state=seed)
+        return df.head(max_rows) if max_rows is not None else df
+    if not isinstance(df, SparkDataFrame):
+        df = df.toDF()  # an rdd payload
+    if columns is not None:
+        df = df.select(*columns)
+    if sample_fraction is not None:
+        df = df.sample(fraction=sample_fraction, seed=seed)
+    return df.limit(max_rows) if max_rows is not None else df
+
+
+def __dictionary_encode(table: pa.Table) -> pa.Table:
+    for index, field in enumerate(table.schema):
+        if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            table = table.set_column(index, field.name, table.column(index).dictionary_encode())
+    return table
@@ -1,7 +1,10 @@
 import pandas as pd
 from pandas.api.types import is_numeric_dtype, is_string_dtype
 
+from .conversion import accepts_cardo_dataframe
 
+
+@accepts_cardo_dataframe()
 def str_to_cats(dataframe: pd.DataFrame):
     """
     Convert string column to categories
@@ -12,6 +15,7 @@ def str_to_cats(dataframe: pd.DataFrame):
     return dataframe
 
 
+@accepts_cardo_dataframe()
 def apply_cats(dataframe: pd.DataFrame, cats_dataframe: pd.DataFrame):
     """
     apply the categories in cats_dataframe to dataframe
@@ -21,11 +25,11 @@ def apply_cats(dataframe: pd.DataFrame, cats_dataframe: pd.DataFrame):
     """
     for col_name, col in dataframe.items():
         if (col_name in cats_dataframe.columns) and (cats_dataframe[col_name].dtype.name == 'category'):
-            dataframe[col_name] = col.astype('category').cat.as_ordered()
-            dataframe[col_name] = col.cat.set_categories(cats_dataframe[col_name].car.categories, ordered=True)
+            dataframe[col_name] = pd.Categorical(col, categories=cats_dataframe[col_name].cat.categories, ordered=True)
     return dataframe
 
 
+@accepts_cardo_dataframe()
 def cats_to_codes(dataframe: pd.DataFrame, max_n_cats: int = None):
     """
     converst categories to ints
@@ -35,7 +39,8 @@ def cats_to_codes(dataframe: pd.DataFrame, max_n_cats: int = None):
     """
     for col_name, col in dataframe.items():
         if not is_numeric_dtype(col) and (max_n_cats is None or len(col.cat.categories) > max_n_cats):
-            dataframe[col_name] = pd.Categorical(col).codes + 1  # nulls are -1 so with +1 they are 0
+            codes = col.cat.codes if isinstance(col.dtype, pd.CategoricalDtype) else pd.Categorical(col).codes
+            dataframe[col_name] = codes + 1  # nulls are -1 so with +1 they are 0
     return dataframe
 
 
@@ -0,0 +1,211 @@
+import html
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import redirect_stdout
+from typing import Callable, Dict, List, NamedTuple, Union
+
+import matplotlib.pyplot as plt
+import pandas as pd
+import pyspark.sql.functions as F
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from pyspark.sql import DataFrame as SparkDataFrame
+from pyspark.sql.types import BooleanType, NumericType
+
+from CardoML.Common.StepCache.fingerprint import code_version, hash_parts, stable_repr
+from . import summaries, visualization
+from .summaries import DEFAULT_BINS, DEFAULT_SAMPLE_SIZE, Data, correlation, histogram, moments, outlier_box_stats, \
+    rank_correlation, sample
+
+FIGURES_DIRECTORY = 'figures'
+INDEX_FILE = 'index.html'
+META_FILE = 'meta.json'
+BACKEND = 'Agg'
+DPI = 100
+
+
+class RenderTask(NamedTuple):
+    title: str
+    function: str  # the name of a `plot_` function of `visualization`
+    args: tuple  # the summaries it draws
+    key: str
+
+
+class RenderedFigures(NamedTuple):
+    title: str
+    figures: List[str]  # png file names
+    text: str
+    cached: bool
+
+
+class PlannedTask(NamedTuple):
+    title: str
+    function: str
+    summarize: Callable[[], tuple]  # computes the args of the task where the data is, only when it isn't cached
+    key: str
+
+
+def render_task(task: RenderTask, directory: str) -> RenderedFigures:
+    """
+    Run a plotting function with a non interactive backend, save its figures as png files in directory, and keep
+    what it printed
+    """
+    plt.switch_backend(BACKEND)
+    output = io.StringIO()
+    with visualization.collect_figures() as figures, redirect_stdout(output):
+        getattr(visualization, task.function)(*task.args)
+    names = []
+    for index, figure in enumerate(figures):
+        names.append('{}_{}.png'.format(task.key, index))
+        figure.savefig(os.path.join(directory, names[-1]), dpi=DPI, bbox_inches='tight')
+    return RenderedFigures(task.title, names, output.getvalue(), False)
+
+
+class FeatureReport:
+    """
+    Render the feature plots of a dataframe without a notebook: `describe_col` (and `find_outliers` against a label)
+    for every column, and the `heatmap` and `feature_similarity` of all of them, into one html page with its png
+    files. The summaries (histograms, moments, quantiles, samples, correlations) are computed where the data is, and
+    only they are sent to a process pool that draws them in parallel. The figures are cached by the content of their
+    columns and the version of the plotting code, so the next run only summarizes and draws the columns that changed.
+
+        FeatureReport('reports/2020-01-01', cache_dir='reports/cache').render(df, label='is_match')
+    """
+    def __init__(self, output_dir: str, cache_dir: str = None, max_workers: int = None, title: str = 'Features'):
+        """
+        :param output_dir: the directory of the bundle (index.html and the figures)
+        :param cache_dir: keep the figures of every column there between runs
+        :param max_workers: the processes that draw, by default the number of cpus
+        """
+        self.output_dir = output_dir
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.title = title
+
+    def render(self, data: Data, columns: List[str] = None, label: str = None, similarity: bool = True,
+               correlations: bool = True, bins: int = DEFAULT_BINS, sample_size: int = DEFAULT_SAMPLE_SIZE,
+               seed: int = None) -> str:
+        """
+        :param columns: the columns to describe, by default the numeric columns
+        :param label: draw the outliers of every column against it
+        :return: the path of the html file
+        """
+        df = data.dataframe if isinstance(data, CardoDataFrame) else data
+        if not isinstance(df, (pd.DataFrame, SparkDataFrame)):
+            df = df.toDF()  # an rdd payload
+        columns = columns or [col for col in self.__numeric_columns(df) if col != label]
+        tasks = self.__plan(df, columns, label, similarity, correlations, bins, sample_size, seed)
+        figures_dir = os.path.join(self.output_dir, FIGURES_DIRECTORY)
+        os.makedirs(figures_dir, exist_ok=True)
+
+        rendered = {task.key: self.__from_cache(task, figures_dir) for task in tasks}
+        to_render = [task for task in tasks if rendered[task.key] is None]
+        if to_render:
+            with ProcessPoolExecutor(max_workers=self.max_workers,
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = {}  # type: Dict[str, Future]
+                for task in to_render:  # the next summaries are computed while the previous ones are drawn
+                    futures[task.key] = pool.submit(render_task, RenderTask(task.title, task.function,
+                                                                            task.summarize(), task.key), figures_dir)
+                for task in to_render:
+                    rendered[task.key] = futures[task.key].result()
+                    self.__to_cache(rendered[task.key], task.key, figures_dir)
+
+        path = os.path.join(self.output_dir, INDEX_FILE)
+        with open(path, 'w') as index_file:
+            index_file.write(self.__html([rendered[task.key] for task in tasks], len(to_render)))
+        return path
+
+    def __plan(self, df: Union[pd.DataFrame, SparkDataFrame], columns: List[str], label: str, similarity: bool,
+               correlations: bool, bins: int, sample_size: int, seed: int) -> List[PlannedTask]:
+        column_hashes = self.__column_hashes(df, columns + ([label] if label is not None and label not in columns
+                                                           else []))
+        version = hash_parts(code_version(visualization), code_version(summaries))
+        tasks = []
+        for col in columns:
+            tasks.append(PlannedTask(
+                col, 'plot_col_description',
+                lambda col=col: (col, histogram(df, col, bins), moments(df, col),
+                                 sample(df, sample_size, columns=[col], seed=seed)),
+                hash_parts(version, 'describe_col', stable_repr([col, bins, sample_size, seed]), column_hashes[col])))
+            if label is not None:
+                tasks.append(PlannedTask(
+                    '{} by {}'.format(col, label), 'plot_outliers',
+                    lambda col=col: (col, label, outlier_box_stats(df, col, label, seed=seed)),
+                    hash_parts(version, 'find_outliers', stable_repr([col, label, seed]), column_hashes[col],
+                               column_hashes[label])))
+        all_hashes = [column_hashes[col] for col in columns]
+        selected = df[columns] if isinstance(df, pd.DataFrame) else df.select(*columns)
+        if correlations:
+            tasks.append(PlannedTask(
+                'correlations', 'plot_heatmap',
+                lambda: self.__correlation_args(*correlation(selected, sample_size, seed)),
+                hash_parts(version, 'heatmap', stable_repr([sample_size, seed]), *all_hashes)))
+        if similarity:
+            tasks.append(PlannedTask(
+                'similarity', 'plot_feature_similarity',
+                lambda: self.__correlation_args(*rank_correlation(selected, sample_size, seed)),
+                hash_parts(version, 'feature_similarity', stable_repr([sample_size, seed]), *all_hashes)))
+        return tasks
+
+    @staticmethod
+    def __correlation_args(corr: pd.DataFrame, rows: summaries.Sample) -> tuple:
+        return corr, rows.note()  # not the sample itself, the plot only needs the correlations
+
+    @staticmethod
+    def __numeric_columns(df: Union[pd.DataFrame, SparkDataFrame]) -> List[str]:
+        if isinstance(df, pd.DataFrame):
+            return list(df.select_dtypes(include=['number', 'bool']).columns)
+        return [field.name for field in df.schema.fields if isinstance(field.dataType, (NumericType, BooleanType))]
+
+    @staticmethod
+    def __column_hashes(df: Union[pd.DataFrame, SparkDataFrame], columns: List[str]) -> Dict[str, str]:
+        """
+        An order independent hash of the content of every column, computed in one pass where the data is
+        """
+        if isinstance(df, pd.DataFrame):
+            return {col: hash_parts(str(col), str(df[col].dtype), str(len(df)),
+                                    str(int(pd.util.hash_pandas_object(df[col], index=False).sum())))
+                    for col in columns}
+        types = dict(df.dtypes)
+        row = df.agg(F.count(F.lit(1)),
+                     *[F.sum(F.xxhash64(F.col(col)).cast('decimal(38,0)')) for col in columns]).first()
+        return {col: hash_parts(col, types[col], str(row[0]), str(row[index + 1])) for index, col in enumerate(columns)}
+
+    def __from_cache(self, task: PlannedTask, figures_dir: str) -> RenderedFigures:
+        if self.cache_dir is None or not os.path.exists(os.path.join(self.cache_dir, task.key, META_FILE)):
+            return None
+        with open(os.path.join(self.cache_dir, task.key, META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+        for name in meta['figures']:
+            shutil.copy2(os.path.join(self.cache_dir, task.key, name), figures_dir)
+        return RenderedFigures(task.title, meta['figures'], meta['text'], True)
+
+    def __to_cache(self, rendered: RenderedFigures, key: str, figures_dir: str) -> None:
+        if self.cache_dir is None:
+            return
+        directory = os.path.join(self.cache_dir, key)
+        os.makedirs(directory, exist_ok=True)
+        for name in rendered.figures:
+            shutil.copy2(os.path.join(figures_dir, name), directory)
+        with open(os.path.join(directory, META_FILE), 'w') as meta_file:  # written last, marks a complete entry
+            json.dump({'figures': rendered.figures, 'text': rendered.text}, meta_file)
+
+    def __html(self, rendered: List[RenderedFigures], rendered_count: int) -> str:
+        sections = []
+        for figures in rendered:
+            images = ''.join('<img src="{}/{}">'.format(FIGURES_DIRECTORY, html.escape(name))
+                             for name in figures.figures)
+            text = '<pre>{}</pre>'.format(html.escape(figures.text)) if figures.text else ''
+            sections.append('<section><h2>{}</h2>{}{}</section>'.format(html.escape(figures.title), images, text))
+        return ('<!DOCTYPE html><html><head><meta charset="utf-8"><title>{title}</title>'
+                '<style>img {{max-width: 48%; margin: 4px;}} section {{border-top: 1px solid #ccc;}}</style></head>'
+                '<body><h1>{title}</h1><p>{created}, {rendered} of {total} rendered, the rest from the cache</p>'
+                '{sections}</body></html>').format(title=html.escape(self.title),
+                                                   created=time.strftime('%Y-%m-%d %H:%M:%S'),
+                                                   rendered=rendered_count, total=len(rendered),
+                                                   sections=''.join(sections))
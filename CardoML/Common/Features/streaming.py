@@ -0,0 +1,117 @@
+import os
+from typing import Any, Iterator, List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from CardoML.Common.Core.core import generic_fillna
+from .categorical_encoder import CategoricalEncoder
+
+PANDAS_EXPANSION = 3  # a row in pandas (python strings, intermediate copies) takes about that much its parquet size
+
+
+def parquet_files(path: str) -> List[str]:
+    """
+    The parquet files of a path, a single file or a directory of part files (the layout spark and `save_data` write)
+    """
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(os.path.join(path, file_name) for file_name in os.listdir(path)
+                  if not file_name.startswith(('_', '.')) and os.path.isfile(os.path.join(path, file_name)))
+
+
+def iter_parquet_chunks(path: str, columns: List[str] = None, max_memory_bytes: int = None) -> Iterator[pd.DataFrame]:
+    """
+    Read parquet one row group at a time, or in smaller batches when a row group would take more than
+    max_memory_bytes in pandas
+    """
+    for file_path in parquet_files(path):
+        parquet_file = pq.ParquetFile(file_path)
+        metadata = parquet_file.metadata
+        for row_group in range(metadata.num_row_groups):
+            rows = metadata.row_group(row_group).num_rows
+            row_bytes = metadata.row_group(row_group).total_byte_size * PANDAS_EXPANSION / max(rows, 1)
+            if max_memory_bytes is None or rows * row_bytes <= max_memory_bytes:
+                yield parquet_file.read_row_group(row_group, columns=columns).to_pandas()
+                continue
+            batch_rows = max(int(max_memory_bytes // max(row_bytes, 1)), 1)
+            for batch in parquet_file.iter_batches(batch_size=batch_rows, row_groups=[row_group], columns=columns):
+                yield batch.to_pandas()
+
+
+class StreamingFeatures:
+    """
+    Run generic_fillna, the categorical encoding and the conversion to codes over parquet data that doesn't fit in
+    memory, chunk by chunk. the categories are learned from all the chunks first, so every chunk is encoded with the
+    same global categories, and the result is written out chunk by chunk.
+
+        features = StreamingFeatures(CategoricalEncoder(max_categories=1000), max_memory_bytes=2 * 1024 ** 3)
+        features.fit_transform('data/', 'encoded.parquet')
+    """
+    def __init__(self, encoder: CategoricalEncoder = None, fill_zeros: bool = True, fill_value: Any = np.nan,
+                 to_codes: bool = True, columns: List[str] = None, max_memory_bytes: int = None):
+        """
+        :param encoder: the encoder to fit (or an already fitted one, then `fit` can be skipped)
+        :param fill_zeros: passed to generic_fillna
+        :param fill_value: passed to generic_fillna
+        :param to_codes: write the codes of the categories (like cats_to_codes) instead of categoricals
+        :param columns: read only these columns
+        :param max_memory_bytes: the memory a chunk can take in pandas, row groups that are bigger are split
+        """
+        self.encoder = encoder or CategoricalEncoder()
+        self.fill_zeros = fill_zeros
+        self.fill_value = fill_value
+        self.to_codes = to_codes
+        self.columns = columns
+        self.max_memory_bytes = max_memory_bytes
+
+    def chunks(self, path: str) -> Iterator[pd.DataFrame]:
+        for chunk in iter_parquet_chunks(path, self.columns, self.max_memory_bytes):
+            yield generic_fillna(chunk, self.fill_zeros, self.fill_value, inplace=True)
+
+    def fit(self, path: str) -> 'StreamingFeatures':
+        self.encoder.counts = {}
+        self.encoder.categories = {}
+        for chunk in self.chunks(path):
+            self.encoder.partial_fit(chunk)
+        return self
+
+    def transform_chunks(self, path: str) -> Iterator[pd.DataFrame]:
+        for chunk in self.chunks(path):
+            if self.to_codes:
+                yield self.encoder.transform_codes(chunk, inplace=True)
+            else:
+                yield self.encoder.transform(chunk, inplace=True)
+
+    def transform(self, path: str, output_path: str) -> int:
+        """
+        :return: the number of rows written to output_path (one parquet file, a row group per chunk)
+        """
+        rows = 0
+        writer = None
+        try:
+            for chunk in self.transform_chunks(path):
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, self.__output_schema(path, chunk))
+                writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
+    def fit_transform(self, path: str, output_path: str) -> int:
+        return self.fit(path).transform(path, output_path)
+
+    def __output_schema(self, path: str, chunk: pd.DataFrame) -> pa.Schema:
+        """
+        The schema of the input, with the types of the encoded columns. not inferred from a chunk, where a column
+        can be all null
+        """
+        input_schema = pq.ParquetFile(parquet_files(path)[0]).schema_arrow
+        encoded = pa.Schema.from_pandas(chunk[[col_name for col_name in chunk.columns
+                                               if col_name in self.encoder.categories]], preserve_index=False)
+        return pa.schema([encoded.field(col_name) if col_name in self.encoder.categories
+                          else input_schema.field(col_name) for col_name in chunk.columns])
@@ -0,0 +1,210 @@
+from typing import Iterable, List, NamedTuple, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyspark.sql.functions as F
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from pyspark.sql import DataFrame as SparkDataFrame
+
+from .conversion import to_pandas
+
+DEFAULT_SAMPLE_SIZE = 100000
+DEFAULT_BINS = 50
+DEFAULT_RELATIVE_ERROR = 0.01
+DEFAULT_MAX_FLIERS = 1000
+BOX_QUANTILES = [0.0, 0.25, 0.5, 0.75, 1.0]
+SUMMARY_QUANTILES = [round(float(q), 3) for q in np.linspace(0, 1, 41)]  # steps of 0.025: a violin, and the quartiles
+COUNT = 'count'
+MEAN = 'mean'
+
+Data = Union[pd.DataFrame, SparkDataFrame, CardoDataFrame]
+
+
+class Histogram(NamedTuple):
+    edges: np.ndarray
+    counts: np.ndarray
+    count: int
+
+
+class Moments(NamedTuple):
+    count: int
+    mean: float
+    std: float
+    skewness: float
+    kurtosis: float
+
+
+class Sample(NamedTuple):
+    data: pd.DataFrame
+    total: int  # the number of rows that were sampled from
+
+    def note(self) -> str:
+        if len(self.data) == self.total:
+            return f"n = {self.total:,}"
+        return f"sample of {len(self.data):,} out of {self.total:,} rows"
+
+
+def reservoir_sample(chunks: Iterable[pd.DataFrame], size: int = DEFAULT_SAMPLE_SIZE, seed: int = None) -> Sample:
+    """
+    A uniform sample of size rows from a stream of chunks (ex: `iter_parquet_chunks`), holding at most size rows and
+    one chunk: every row gets a random key and the rows with the smallest keys so far are kept.
+    """
+    random = np.random.RandomState(seed)
+    reservoir, keys, total = None, np.empty(0), 0
+    for chunk in chunks:
+        total += len(chunk)
+        chunk_keys = random.random_sample(len(chunk))
+        candidates = chunk if reservoir is None else pd.concat([reservoir, chunk], ignore_index=True, copy=False)
+        keys = np.concatenate([keys, chunk_keys])
+        if len(keys) > size:
+            kept = np.argpartition(keys, size)[:size]
+            candidates, keys = candidates.iloc[kept].reset_index(drop=True), keys[kept]
+        reservoir = candidates
+    return Sample(reservoir if reservoir is not None else pd.DataFrame(), total)
+
+
+def sample(data: Data, size: int = DEFAULT_SAMPLE_SIZE, columns: List[str] = None, seed: int = None) -> Sample:
+    """
+    A uniform sample of about size rows, a spark dataframe is sampled before it is transferred
+    """
+    df = data.dataframe if isinstance(data, CardoDataFrame) else data
+    if isinstance(df, SparkDataFrame):
+        df = df.select(*columns) if columns is not None else df
+        total = df.count()
+        if total > size:
+            # a bit more than size rows, then exactly size of them at random (limit alone keeps the first partitions)
+            df = df.sample(fraction=min(1.0, size * 1.1 / total), seed=seed).orderBy(F.rand(seed)).limit(size)
+        return Sample(to_pandas(df), total)
+    if not isinstance(df, pd.DataFrame):
+        return reservoir_sample(df if columns is None else (chunk[columns] for chunk in df), size, seed)
+    df = df[columns] if columns is not None else df
+    return Sample(df.sample(n=size, random_state=seed) if len(df) > size else df, len(df))
+
+
+def rank_correlation(data: Data, size: int = DEFAULT_SAMPLE_SIZE, seed: int = None) -> Tuple[pd.DataFrame, Sample]:
+    """
+    Spearman correlation of all the columns (categories by their codes), on a sample
+    """
+    rows = sample(data, size, seed=seed)
+    numeric = rows.data.apply(lambda col: col.cat.codes if isinstance(col.dtype, pd.CategoricalDtype) else col)
+    return numeric.rank().corr(), rows
+
+
+def correlation(data: Data, size: int = DEFAULT_SAMPLE_SIZE, seed: int = None) -> Tuple[pd.DataFrame, Sample]:
+    """
+    Pearson correlation of the numeric columns, on a sample
+    """
+    rows = sample(data, size, seed=seed)
+    return rows.data.select_dtypes(include=['number', 'bool']).corr(), rows
+
+
+def histogram(data: Data, col: str, bins: int = DEFAULT_BINS) -> Histogram:
+    """
+    Equal width bins of a column, counted where the data is (one aggregation for the range and one for the counts
+    in spark), so only the counts are transferred
+    """
+    df = data.dataframe if isinstance(data, CardoDataFrame) else data
+    if isinstance(df, SparkDataFrame):
+        values = df.select(F.col(col).cast('double').alias(col)).filter(F.col(col).isNotNull() & ~F.isnan(col))
+        minimum, maximum, count = values.agg(F.min(col), F.max(col), F.count(F.lit(1))).first()
+        if not count:
+            return Histogram(np.zeros(bins + 1), np.zeros(bins, dtype=int), 0)
+        edges = np.linspace(minimum, maximum, bins + 1) if maximum > minimum else \
+            np.linspace(minimum - 0.5, minimum + 0.5, bins + 1)
+        width = edges[1] - edges[0]
+        bucket = F.least(F.floor((F.col(col) - F.lit(float(edges[0]))) / F.lit(float(width))), F.lit(bins - 1))
+        counts = np.zeros(bins, dtype=int)
+        for row in values.groupBy(bucket.cast('int').alias('bucket')).count().collect():
+            counts[row['bucket']] = row[COUNT]
+        return Histogram(edges, counts, count)
+    values = df[col].dropna().to_numpy(dtype=float)
+    counts, edges = np.histogram(values, bins=bins)
+    return Histogram(edges, counts, len(values))
+
+
+def moments(data: Data, col: str) -> Moments:
+    df = data.dataframe if isinstance(data, CardoDataFrame) else data
+    if isinstance(df, SparkDataFrame):
+        return Moments(*df.agg(F.count(col), F.mean(col), F.stddev(col), F.skewness(col), F.kurtosis(col)).first())
+    values = df[col]
+    return Moments(int(values.count()), values.mean(), values.std(), values.skew(), values.kurt())
+
+
+def quantile_summaries(data: Data, columns: List[str], label_col: str = None, quantiles: List[float] = None,
+                       relative_error: float = DEFAULT_RELATIVE_ERROR) -> pd.DataFrame:
+    """
+    The quantiles of every column (per label if label_col is given), computed where the data is.
+    `box_stats` needs the quantiles 0, 0.25, 0.5, 0.75 and 1
+    :return: a row per (feature, label) with a column per quantile, a `count` and a `mean` column
+    """
+    quantiles = quantiles or SUMMARY_QUANTILES
+    df = data.dataframe if isinstance(data, CardoDataFrame) else data
+    if isinstance(df, SparkDataFrame):
+        grouped = df.groupBy(label_col) if label_col is not None else df.groupBy()
+        accuracy = int(1 / relative_error)
+        rows = grouped.agg(*[F.percentile_approx(col, quantiles, accuracy).alias(col) for col in columns],
+                           *[F.count(col).alias('{}_{}'.format(COUNT, col)) for col in columns],
+                           *[F.mean(col).alias('{}_{}'.format(MEAN, col)) for col in columns]).collect()
+        records = [dict(zip(quantiles, row[col] or [np.nan] * len(quantiles)), feature=col,
+                        label=row[label_col] if label_col is not None else None,
+                        count=row['{}_{}'.format(COUNT, col)], mean=row['{}_{}'.format(MEAN, col)])
+                   for row in rows for col in columns]
+    else:
+        groups = df.groupby(label_col) if label_col is not None else [(None, df)]
+        records = [dict(zip(quantiles, group[col].quantile(quantiles).to_numpy()), feature=col, label=label,
+                        count=int(group[col].count()), mean=group[col].mean())
+                   for label, group in groups for col in columns]
+    return pd.DataFrame.from_records(records).set_index(['feature', 'label']).sort_index()
+
+
+def box_stats(summary: pd.Series, label: str = None) -> dict:
+    """
+    The stats `Axes.bxp` draws, from a row of `quantile_summaries` (whiskers at 1.5 IQR, no fliers), and the count
+    of values they summarize
+    """
+    q1, median, q3 = summary[0.25], summary[0.5], summary[0.75]
+    iqr = q3 - q1
+    return {'med': median, 'q1': q1, 'q3': q3, 'whislo': max(summary[0.0], q1 - 1.5 * iqr),
+            'whishi': min(summary[1.0], q3 + 1.5 * iqr), 'fliers': [], 'label': label, COUNT: int(summary[COUNT])}
+
+
+def violin_stats(summary: pd.Series, quantiles: List[float] = None) -> dict:
+    """
+    The stats `Axes.violin` draws, from a row of `quantile_summaries`: the density between two quantiles is the
+    probability between them divided by their distance
+    """
+    quantiles = quantiles or SUMMARY_QUANTILES
+    values = summary[quantiles].to_numpy(dtype=float)
+    probabilities = np.diff(quantiles)
+    widths = np.diff(values)
+    density = np.divide(probabilities, widths, out=np.zeros_like(widths), where=widths > 0)
+    return {'coords': (values[:-1] + values[1:]) / 2, 'vals': density, 'mean': summary[MEAN], 'median': summary[0.5],
+            'min': values[0], 'max': values[-1]}
+
+
+def outlier_box_stats(data: Data, col: str, label_col: str, max_fliers: int = DEFAULT_MAX_FLIERS,
+                      relative_error: float = DEFAULT_RELATIVE_ERROR, seed: int = None) -> List[dict]:
+    """
+    `box_stats` of col for every label, with the values outside the whiskers as fliers (a random max_fliers of them
+    when there are more), found where the data is
+    """
+    summaries = quantile_summaries(data, [col], label_col, BOX_QUANTILES, relative_error)
+    df = data.dataframe if isinstance(data, CardoDataFrame) else data
+    stats = []
+    for (_, label), summary in summaries.iterrows():
+        label = label.item() if isinstance(label, np.generic) else label
+        label_stats = box_stats(summary, str(label))
+        if isinstance(df, SparkDataFrame):
+            is_label = F.col(label_col).isNull() if label is None else F.col(label_col) == F.lit(label)
+            outside = (F.col(col) < F.lit(float(label_stats['whislo']))) | \
+                (F.col(col) > F.lit(float(label_stats['whishi'])))
+            fliers = df.filter(is_label & outside).select(col).orderBy(F.rand(seed)).limit(max_fliers)
+            label_stats['fliers'] = np.array([row[0] for row in fliers.collect()], dtype=float)
+        else:
+            values = df.loc[(df[label_col].isna() if label is None else df[label_col] == label), col]
+            values = values[(values < label_stats['whislo']) | (values > label_stats['whishi'])]
+            if len(values) > max_fliers:
+                values = values.sample(n=max_fliers, random_state=seed)
+            label_stats['fliers'] = values.to_numpy(dtype=float)
+        stats.append(label_stats)
+    return stats
@@ -1,80 +1,167 @@
+from contextlib import contextmanager
+from typing import Iterator, List
+
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 from scipy.stats import norm
 import scipy
 import seaborn as sns
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from matplotlib.patches import Patch
+
+from .summaries import DEFAULT_BINS, DEFAULT_SAMPLE_SIZE, Data, Histogram, Moments, Sample, box_stats, correlation, \
+    histogram, moments, outlier_box_stats, quantile_summaries, rank_correlation, sample, violin_stats
+
+__collected_figures = None  # type: List[plt.Figure]
+
+
+@contextmanager
+def collect_figures() -> Iterator[List[plt.Figure]]:
+    """
+    Collect the figures of the plotting functions instead of showing them, for reports:
+
+        with collect_figures() as figures:
+            describe_col(df, 'amount')
+        figures[0].savefig('amount.png')
+    """
+    global __collected_figures
+    previous, __collected_figures = __collected_figures, []
+    try:
+        yield __collected_figures
+    finally:
+        __collected_figures = previous
 
 
-def feature_similarity(features: pd.DataFrame, figsize: tuple = (16, 10), font_size: int = 15) -> None:
+def feature_similarity(features: Data, figsize: tuple = (16, 10), font_size: int = 15,
+                       sample_size: int = DEFAULT_SAMPLE_SIZE) -> None:
     """
-    Plot an hierarchy graph that visualise the similarity of columns
+    Plot an hierarchy graph that visualise the similarity of columns, by their rank correlation on a sample
     """
     # not as good for continuous features, find a way to do it by column type
-    corr = np.round(scipy.stats.spearmanr(features).correlation, 4)
-    corr_condensed = scipy.cluster.hierarchy.distance.squareform(1 - corr)
+    corr, rows = rank_correlation(features, sample_size)
+    plot_feature_similarity(corr, rows.note(), figsize, font_size)
+
+
+def plot_feature_similarity(corr: pd.DataFrame, title: str = '', figsize: tuple = (16, 10), font_size: int = 15):
+    corr_condensed = scipy.cluster.hierarchy.distance.squareform(1 - np.round(corr.to_numpy(), 4), checks=False)
     z = scipy.cluster.hierarchy.linkage(corr_condensed, method='average')
     fig = plt.figure(figsize=figsize)
-    dendrogram = scipy.cluster.hierarchy.dendrogram(z, labels=features.columns, orientation='left',
+    dendrogram = scipy.cluster.hierarchy.dendrogram(z, labels=corr.columns, orientation='left',
                                                     leaf_font_size=font_size)
-    plt.show()
-    return
+    plt.title(title)
+    __show()
 
 
-def describe_col(df: pd.DataFrame, col: str):
+def describe_col(df: Data, col: str, bins: int = DEFAULT_BINS, sample_size: int = DEFAULT_SAMPLE_SIZE):
     """
     blue line = gaussian distribution
     black line = normal probability
+    The histogram is drawn from pre-binned counts, the probability plot from a sample.
     """
-    sns.distplot(df[col], fit=norm)
-    plt.show()
-    scipy.stats.probplot(df[col], plot=plt)
-    plt.show()
-    print(f"Skewness: {df[col].skew()}")
-    print(f"Kurtosis: {df[col].kurt()}")
+    plot_col_description(col, histogram(df, col, bins), moments(df, col), sample(df, sample_size, columns=[col]))
 
 
-def find_outliers(df: pd.DataFrame, col: str, label: str, plot_type: str = 'box', figsize: tuple = (20, 10)):
+def plot_col_description(col: str, col_histogram: Histogram, col_moments: Moments, rows: Sample):
+    widths = np.diff(col_histogram.edges)
+    plt.bar(col_histogram.edges[:-1], col_histogram.counts / max(col_histogram.count, 1) / widths, width=widths,
+            align='edge', alpha=0.4)
+    plt.plot(col_histogram.edges, norm.pdf(col_histogram.edges, col_moments.mean, col_moments.std))
+    plt.title(f"{col} (n = {col_histogram.count:,})")
+    __show()
+    scipy.stats.probplot(rows.data[col].dropna(), plot=plt)
+    plt.title(rows.note())
+    __show()
+    print(f"Skewness: {col_moments.skewness}")
+    print(f"Kurtosis: {col_moments.kurtosis}")
+
+
+def find_outliers(df: Data, col: str, label: str, plot_type: str = 'box', figsize: tuple = (20, 10),
+                  sample_size: int = DEFAULT_SAMPLE_SIZE):
     """
     :param df:
     :param col:
     :param label:
-    :param plot_type: box or scatter
+    :param plot_type: box (from the quantiles of every label and some of its outliers) or scatter (of a sample)
     :param figsize:
     :return:
     """
-    plt.figure(figsize=figsize)
-    data = pd.concat([df[col], df[label]], axis=1)
-
     if plot_type == 'box':
-        sns.boxplot(x=col, y=label, data=data)
+        plot_outliers(col, label, outlier_box_stats(df, col, label), figsize)
     if plot_type == 'scatter':
-        data.plot.scatter(x=col, y=label, figsize=figsize)
+        rows = sample(df, sample_size, columns=[col, label])
+        rows.data.plot.scatter(x=col, y=label, figsize=figsize)
+        plt.title(rows.note())
+        plt.xticks(rotation=90)
+        __show()
+
 
+def plot_outliers(col: str, label: str, stats: List[dict], figsize: tuple = (20, 10)):
+    fig, ax = plt.subplots(figsize=figsize)
+    ax.bxp([dict(label_stats, label=f"{label_stats['label']} (n = {label_stats['count']:,})")
+            for label_stats in stats], vert=False, showfliers=True)
+    total = sum(label_stats['count'] for label_stats in stats)
+    fliers = sum(len(label_stats['fliers']) for label_stats in stats)
+    plt.title(f"{col} by {label} (n = {total:,}, {fliers:,} outliers drawn)")
+    ax.set_xlabel(col)
+    ax.set_ylabel(label)
     plt.xticks(rotation=90)
-    plt.show()
+    __show()
 
 
-def heatmap(df: pd.DataFrame, show_num: bool = True, figsize: tuple = (12, 9)):
-    corr = df.corr()
+def heatmap(df: Data, show_num: bool = True, figsize: tuple = (12, 9), sample_size: int = DEFAULT_SAMPLE_SIZE):
+    corr, rows = correlation(df, sample_size)
+    plot_heatmap(corr, rows.note(), show_num, figsize)
+
+
+def plot_heatmap(corr: pd.DataFrame, title: str = '', show_num: bool = True, figsize: tuple = (12, 9)):
     plt.figure(figsize=figsize)
     sns.heatmap(corr, annot=show_num, fmt='.2f')
-    plt.show()
+    plt.title(title)
+    __show()
 
 
-def compare_labeled_data(df: pd.DataFrame, label_col: str, plot_type: str = 'violin', figsize: tuple = (12, 9)):
+def compare_labeled_data(df: Data, label_col: str, plot_type: str = 'violin', figsize: tuple = (12, 9)):
     """
+    Draw the distribution of every feature per label, from quantile summaries (no melt of the data)
     :param df:
     :param label_col:
     :param plot_type: violin or box
     :param figsize:
     :return:
     """
-    data = pd.melt(df, id_vars=label_col, var_name='features', value_name='value')
-    plt.figure(figsize=figsize)
-    if plot_type == 'violin':
-        sns.violinplot(x='features', y='value', hue=label_col, data=data, split=True, inner='quart')
-    elif plot_type == 'box':
-        sns.boxplot(x='features', y='value', hue=label_col, data=data)
+    columns = [col for col in (df.dataframe if isinstance(df, CardoDataFrame) else df).columns if col != label_col]
+    summaries = quantile_summaries(df, columns, label_col)
+    labels = list(summaries.index.unique('label'))
+    width = 0.8 / max(len(labels), 1)
+    fig, ax = plt.subplots(figsize=figsize)
+    handles = []
+    for index, label in enumerate(labels):
+        positions = np.arange(len(columns)) - 0.4 + width * (index + 0.5)
+        color = 'C{}'.format(index)
+        if plot_type == 'violin':
+            parts = ax.violin([violin_stats(summaries.loc[(col, label)]) for col in columns], positions,
+                              widths=width, showmedians=True)
+            for body in parts['bodies']:
+                body.set_facecolor(color)
+        elif plot_type == 'box':
+            parts = ax.bxp([box_stats(summaries.loc[(col, label)]) for col in columns], positions, widths=width,
+                           patch_artist=True, showfliers=False)
+            for box in parts['boxes']:
+                box.set_facecolor(color)
+        count = summaries.xs(label, level='label')['count'].max()
+        handles.append(Patch(color=color, label=f"{label} (n = {count:,})"))
+    ax.set_xticks(np.arange(len(columns)))
+    ax.set_xticklabels(columns)
+    ax.legend(handles=handles, title=label_col)
     plt.xticks(rotation=45)
-    plt.show()
+    __show()
+
+
+def __show() -> None:
+    if __collected_figures is None:
+        plt.show()
+    else:
+        figure = plt.gcf()
+        __collected_figures.append(figure)
+        plt.close(figure)  # the next plot starts a new figure, like after show
@@ -0,0 +1 @@
+from .file_system import FileStatus, IFileSystem, HadoopFileSystem, LocalFileSystem
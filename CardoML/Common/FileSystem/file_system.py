@@ -0,0 +1,81 @@
+import os
+from abc import ABCMeta, abstractmethod
+from datetime import datetime
+from typing import List, NamedTuple, Tuple
+
+from CardoExecutor.Contract.CardoContextBase import CardoContextBase
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class FileStatus(NamedTuple):
+    path: str
+    modification_time: datetime
+
+
+class IFileSystem(metaclass=ABCMeta):
+    """
+    Lists the snapshot folders that `save_data` and `lazy` write, without shelling out to `hdfs dfs`.
+    """
+    @abstractmethod
+    def list_directory(self, path: str) -> List[FileStatus]:
+        """
+        :return: the statuses of the direct children of path, or an empty list if path doesn't exist
+        """
+        raise NotImplementedError
+
+    def last_modified(self, path: str) -> Tuple[datetime, str]:
+        """
+        :return: the modification time and the path of the most recently modified child of path,
+                 or (1970-01-01, '') if path is empty or doesn't exist
+        """
+        statuses = self.list_directory(path)
+        if not statuses:
+            return EPOCH, ''
+        last_status = max(statuses, key=lambda status: status.modification_time)
+        return last_status.modification_time, last_status.path
+
+    def absolute_path(self, path: str) -> str:
+        """
+        :return: path the way `list_directory` returns it (ex: relative paths resolved against the home directory)
+        """
+        return path
+
+
+class HadoopFileSystem(IFileSystem):
+    """
+    HDFS (or any hadoop filesystem configured in spark) through the spark context's hadoop FileSystem.
+    """
+    def __init__(self, cardo_context: CardoContextBase):
+        spark_context = cardo_context.spark.sparkContext
+        self.jvm = spark_context._jvm
+        self.hadoop_conf = spark_context._jsc.hadoopConfiguration()
+
+    def list_directory(self, path: str) -> List[FileStatus]:
+        hadoop_path = self.jvm.org.apache.hadoop.fs.Path(path)
+        file_system = hadoop_path.getFileSystem(self.hadoop_conf)
+        if not file_system.exists(hadoop_path):
+            return []
+        return [FileStatus(status.getPath().toUri().getPath(),
+                           datetime.fromtimestamp(status.getModificationTime() / 1000))
+                for status in file_system.listStatus(hadoop_path)]
+
+    def absolute_path(self, path: str) -> str:
+        hadoop_path = self.jvm.org.apache.hadoop.fs.Path(path)
+        return hadoop_path.getFileSystem(self.hadoop_conf).makeQualified(hadoop_path).toUri().getPath()
+
+
+class LocalFileSystem(IFileSystem):
+    """
+    The local filesystem, for tests. relative paths are resolved under root.
+    """
+    def __init__(self, root: str = ''):
+        self.root = root
+
+    def list_directory(self, path: str) -> List[FileStatus]:
+        local_path = os.path.join(self.root, path)
+        if not os.path.isdir(local_path):
+            return []
+        return [FileStatus(os.path.join(path, name),
+                           datetime.fromtimestamp(os.path.getmtime(os.path.join(local_path, name))))
+                for name in os.listdir(local_path)]
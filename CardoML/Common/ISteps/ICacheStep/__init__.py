@@ -1 +1,2 @@
 from .icache_step import ICacheStep, cache
+from .cache_manager import CacheManager, cache_manager
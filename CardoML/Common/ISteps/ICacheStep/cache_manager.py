@@ -0,0 +1,190 @@
+import functools
+import time
+from collections import OrderedDict
+from threading import RLock
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Tuple
+from weakref import WeakKeyDictionary
+
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from CardoExecutor.Contract.CardoContextBase import CardoContextBase
+from CardoExecutor.Contract.IStep import IStep
+from CardoExecutor.Workflows.DagWorkflow import DagWorkflow
+
+from CardoML.Common.Core import arguments_key
+from CardoML.Common.Core.config import DATA_ATTRIBUTE
+
+LRU = 'lru'
+COST = 'cost'
+
+
+class CacheEntry:
+    def __init__(self, cardo_dataframe: CardoDataFrame, size_bytes: int, compute_seconds: float):
+        self.cardo_dataframe = cardo_dataframe
+        self.size_bytes = size_bytes
+        self.compute_seconds = compute_seconds
+        self.last_used = time.time()
+
+
+class CacheManager:
+    """
+    Keep track of the results cached by the ICacheSteps.
+    A result (of a step for some arguments) is unpersisted once all the workflows that consume the step finished
+    (see `register_workflows`), or when the cached results exceed max_bytes. a released result is computed again the
+    next time it is needed.
+    Steps that are called directly (not as nodes of a registered workflow) are only released by the budget.
+    An ICacheStep reports to the manager that registered its workflows last, or to the module's `cache_manager` if
+    none did, use `cache_manager.configure` to set its budget.
+    """
+    step_managers = WeakKeyDictionary()  # type: Dict[IStep, CacheManager]
+
+    def __init__(self, max_bytes: int = None, eviction_policy: str = LRU):
+        """
+        :param max_bytes: the storage budget of all the cached results, estimated from the spark plans
+        :param eviction_policy: `lru` evicts the least recently used results first,
+            `cost` evicts the results that took the least time to compute per byte first
+        """
+        self.max_bytes = max_bytes
+        self.eviction_policy = eviction_policy
+        self.entries = OrderedDict()  # type: Dict[Tuple[IStep, Hashable], CacheEntry]
+        self.remaining_consumers = {}  # type: Dict[IStep, int]
+        self.lock = RLock()
+
+    def configure(self, max_bytes: int = None, eviction_policy: str = LRU) -> None:
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.eviction_policy = eviction_policy
+            to_evict = self.__to_evict()
+        self.__release(to_evict)
+
+    def register_workflows(self, workflows: Iterable[DagWorkflow]) -> None:
+        """
+        Count the consumers of every cached step in the workflows that are about to run
+        """
+        with self.lock:
+            for workflow in workflows:
+                for step, consumers in self.__cached_steps(workflow):
+                    self.remaining_consumers[step] = self.remaining_consumers.get(step, 0) + consumers
+                    CacheManager.step_managers[step] = self
+
+    @staticmethod
+    def of(step: IStep) -> 'CacheManager':
+        """
+        :return: the manager that the results of step are reported to
+        """
+        return CacheManager.step_managers.get(step, cache_manager)
+
+    def workflow_finished(self, workflow: DagWorkflow) -> None:
+        """
+        Release the cached steps whose last consumer was in the finished workflow
+        """
+        to_release = []
+        with self.lock:
+            for step, consumers in self.__cached_steps(workflow):
+                if step in self.remaining_consumers:
+                    self.remaining_consumers[step] -= consumers
+                    if self.remaining_consumers[step] <= 0:
+                        del self.remaining_consumers[step]
+                        to_release.extend(entry_key for entry_key in self.entries if entry_key[0] is step)
+        self.__release(to_release)
+
+    def add(self, step: IStep, key: Hashable, cardo_dataframe: CardoDataFrame, compute_seconds: float) -> None:
+        with self.lock:
+            self.entries[(step, key)] = CacheEntry(cardo_dataframe, self.__size_bytes(cardo_dataframe),
+                                                   compute_seconds)
+            to_evict = self.__to_evict(keep=(step, key)) + self.__dropped_by_memo(step)
+        self.__release(to_evict)
+
+    def touch(self, step: IStep, key: Hashable) -> None:
+        with self.lock:
+            if (step, key) in self.entries:
+                self.entries[(step, key)].last_used = time.time()
+                self.entries.move_to_end((step, key))
+
+    def release_all(self) -> None:
+        with self.lock:
+            entry_keys = list(self.entries)
+            self.remaining_consumers.clear()
+        self.__release(entry_keys)
+
+    def cached_bytes(self) -> int:
+        with self.lock:
+            return sum(entry.size_bytes for entry in self.entries.values())
+
+    def __to_evict(self, keep: Tuple[IStep, Hashable] = None) -> List[Tuple[IStep, Hashable]]:
+        if self.max_bytes is None:
+            return []
+        if self.eviction_policy == COST:
+            candidates = sorted(self.entries.items(),
+                                key=lambda item: item[1].compute_seconds / max(item[1].size_bytes, 1))
+        else:
+            candidates = sorted(self.entries.items(), key=lambda item: item[1].last_used)
+        total_bytes = sum(entry.size_bytes for entry in self.entries.values())
+        to_evict = []
+        for entry_key, entry in candidates:
+            if total_bytes <= self.max_bytes:
+                break
+            if entry_key != keep:
+                to_evict.append(entry_key)
+                total_bytes -= entry.size_bytes
+        return to_evict
+
+    def __dropped_by_memo(self, step: IStep) -> List[Tuple[IStep, Hashable]]:
+        """
+        The results of step that its memo no longer holds (dropped by max_entries or expired by ttl)
+        """
+        memo = getattr(step, DATA_ATTRIBUTE, None)
+        if memo is None:
+            return []
+        return [(entry_step, key) for entry_step, key in self.entries if entry_step is step and key not in memo]
+
+    def __release(self, entry_keys: List[Tuple[IStep, Hashable]]) -> None:
+        """
+        Unpersist the results and drop them from the steps, consumers that already got a result keep using it
+        """
+        for step, key in entry_keys:
+            with self.lock:
+                entry = self.entries.pop((step, key), None)
+            memo = getattr(step, DATA_ATTRIBUTE, None)
+            if memo is not None:
+                memo.invalidate(key)
+            if entry is not None and entry.cardo_dataframe.payload_type in ['dataframe', 'rdd']:
+                entry.cardo_dataframe.dataframe.unpersist()
+
+    @staticmethod
+    def __cached_steps(workflow: DagWorkflow) -> Iterator[Tuple[IStep, int]]:
+        from .icache_step import ICacheStep
+        for node in workflow.dag.nodes:
+            step = getattr(node, 'step', node)
+            if isinstance(step, ICacheStep):
+                yield step, max(workflow.dag.out_degree(node), 1)
+
+    @staticmethod
+    def __size_bytes(cardo_dataframe: CardoDataFrame) -> int:
+        if cardo_dataframe.payload_type == 'pandas':
+            return int(cardo_dataframe.dataframe.memory_usage(index=True, deep=True).sum())
+        if cardo_dataframe.payload_type in ['dataframe', 'rdd']:
+            return int(cardo_dataframe.dataframe._jdf.queryExecution().optimizedPlan().stats().sizeInBytes()
+                       .toString())
+        return 0
+
+
+def managed(func: Callable) -> Callable:
+    """
+    Report the results of a cached process to its CacheManager (see `CacheManager.of`), and mark them as used
+    whenever they are returned from the cache. must be used above `register`.
+    """
+    @functools.wraps(func)
+    def inner(self, cardo_context: CardoContextBase, *args, **kwargs):
+        key = arguments_key((cardo_context, *args), kwargs)
+        memo = getattr(self, DATA_ATTRIBUTE, None)
+        if memo is not None and key in memo:
+            CacheManager.of(self).touch(self, key)
+            return func(self, cardo_context, *args, **kwargs)
+        start = time.time()
+        result = func(self, cardo_context, *args, **kwargs)
+        CacheManager.of(self).add(self, key, result, time.time() - start)
+        return result
+    return inner
+
+
+cache_manager = CacheManager()
@@ -1,17 +1,18 @@
 from abc import ABCMeta
 from functools import wraps
-from typing import Callable
+from typing import Callable, Dict
 
 from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
 from CardoExecutor.Contract.CardoContextBase import CardoContextBase
 from CardoExecutor.Contract.IStep import IStep
 
-from CardoML.Common.Core import lock, register, persist
+from CardoML.Common.Core import register, persist
 from ..ILogicStep import ILogicStep
+from .cache_manager import managed
 
 
 def cache(func: Callable) -> Callable:
-    @lock()
+    @managed
     @register()
     @persist
     @wraps(func)
@@ -36,8 +37,20 @@ class ICacheStep(ILogicStep, metaclass=ABCMeta):
             def process(self, cardo_context: CardoContextBase, cardo_dataframe: CardoDataFrame=None) -> CardoDataFrame:
                 ...
                 return CardoDataFrame
+
+    The cached result is released by the `cache_manager` once its consumers finished, set `storage_level`
+    (ex: StorageLevel.DISK_ONLY) to choose how it is persisted.
     """
     node_attributes = {'shape': 'rectangle'}
+    storage_level = None
+    registry = {}  # type: Dict[str, type]
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        Register every class that inherits ICacheStep by its lower case name, for the DataFramesFactory
+        """
+        super().__init_subclass__(**kwargs)
+        ICacheStep.registry[cls.__name__.lower()] = cls
 
     def __new__(cls, *args, **kwargs):
         if cls is ICacheStep:
@@ -0,0 +1,3 @@
+from .fingerprint import dataframe_fingerprint, step_fingerprint
+from .result_storage import IResultStorage, LocalResultStorage, HdfsResultStorage
+from .step_cache import step_cache
@@ -0,0 +1,129 @@
+import hashlib
+import inspect
+import re
+from typing import Any
+
+import pandas as pd
+import pyspark.sql.functions as F
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from CardoExecutor.Contract.CardoContextBase import CardoContextBase
+from CardoExecutor.Contract.IStep import IStep
+
+MAX_DEPTH = 5
+EXPRESSION_ID = re.compile(r'#\d+L?')
+JSON_EXPRESSION_ID = re.compile(r'"exprId":\{[^{}]*\}')
+MAX_FIELDS = 2 ** 31 - 1
+
+
+def hash_parts(*parts: str) -> str:
+    """
+    :param parts: strings to hash together
+    :return: a stable hex digest of all the parts
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def stable_repr(value: Any, depth: int = 0) -> str:
+    """
+    A repr that doesn't change between runs (no memory addresses), used to fingerprint constructor arguments.
+    """
+    if depth > MAX_DEPTH:
+        return type(value).__name__
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return '{}[{}]'.format(type(value).__name__, ', '.join(stable_repr(item, depth + 1) for item in value))
+    if isinstance(value, (set, frozenset)):
+        return '{}[{}]'.format(type(value).__name__, ', '.join(sorted(stable_repr(item, depth + 1) for item in value)))
+    if isinstance(value, dict):
+        return 'dict[{}]'.format(', '.join(sorted('{}: {}'.format(stable_repr(key, depth + 1),
+                                                                  stable_repr(item, depth + 1))
+                                                  for key, item in value.items())))
+    if inspect.ismethod(value):
+        return '{}({})'.format(stable_repr(value.__func__, depth + 1), stable_repr(value.__self__, depth + 1))
+    if inspect.isfunction(value):
+        return '{}.{}:{}({})'.format(value.__module__, value.__qualname__, code_version(value),
+                                     stable_repr(__function_values(value), depth + 1))
+    if inspect.isclass(value):
+        return '{}.{}'.format(value.__module__, value.__qualname__)
+    if hasattr(value, '__dict__'):
+        return '{}.{}({})'.format(type(value).__module__, type(value).__qualname__,
+                                  stable_repr(vars(value), depth + 1))
+    return type(value).__name__
+
+
+def code_version(obj: Any) -> str:
+    """
+    :return: hash of the source code of a class or function, or of its bytecode when the source isn't available
+    """
+    try:
+        return hash_parts(inspect.getsource(obj))
+    except (OSError, TypeError):
+        code = getattr(obj, '__code__', None)
+        return hash_parts(code.co_code.hex()) if code is not None else ''
+
+
+def step_fingerprint(step: IStep) -> str:
+    """
+    :return: fingerprint of the step class, its code and its constructor arguments
+    """
+    step_class = step.__class__
+    return hash_parts(step_class.__module__, step_class.__qualname__,
+                      *[code_version(cls) for cls in step_class.__mro__ if cls.__module__ not in ('builtins', 'abc')],
+                      stable_repr(vars(step)))
+
+
+def dataframe_fingerprint(cardo_context: CardoContextBase, cardo_dataframe: CardoDataFrame) -> str:
+    """
+    Fingerprint of the schema and the content of a CardoDataFrame.
+    A spark dataframe that reads files is fingerprinted by its plan and by the size and modification time of the
+    files it reads, without scanning them. any other dataframe is fingerprinted by hashing its rows.
+    """
+    if cardo_dataframe.payload_type in ['dataframe', 'rdd']:
+        return __spark_fingerprint(cardo_context, cardo_dataframe.dataframe)
+    if cardo_dataframe.payload_type == 'pandas':
+        return __pandas_fingerprint(cardo_dataframe.dataframe)
+    return stable_repr(cardo_dataframe.dataframe)
+
+
+def __spark_fingerprint(cardo_context: CardoContextBase, df) -> str:
+    input_files = sorted(df.inputFiles())
+    if input_files:
+        jvm = cardo_context.spark.sparkContext._jvm
+        hadoop_conf = cardo_context.spark.sparkContext._jsc.hadoopConfiguration()
+        files_statuses = []
+        for input_file in input_files:
+            path = jvm.org.apache.hadoop.fs.Path(input_file)
+            status = path.getFileSystem(hadoop_conf).getFileStatus(path)
+            files_statuses.append('{}:{}:{}'.format(input_file, status.getLen(), status.getModificationTime()))
+        plan = df._jdf.queryExecution().optimizedPlan()
+        # toString truncates long plans (maxToStringFields), the json plan has every literal
+        plan_string = EXPRESSION_ID.sub('', plan.treeString(True, False, MAX_FIELDS, False))
+        plan_json = JSON_EXPRESSION_ID.sub('', plan.toJSON())
+        return hash_parts(df.schema.json(), plan_string, plan_json, *files_statuses)
+    rows_count, rows_hash = df.select(F.count(F.lit(1)),
+                                      F.sum(F.xxhash64(*df.columns).cast('decimal(38,0)'))).first()
+    return hash_parts(df.schema.json(), str(rows_count), str(rows_hash))
+
+
+def __function_values(func) -> list:
+    """
+    The values a function uses besides its code: its defaults and the values of its closure
+    """
+    closure_values = []
+    for cell in func.__closure__ or ():
+        try:
+            closure_values.append(cell.cell_contents)
+        except ValueError:  # a cell that isn't assigned yet
+            closure_values.append(None)
+    return [func.__defaults__, func.__kwdefaults__, closure_values]
+
+
+def __pandas_fingerprint(df: pd.DataFrame) -> str:
+    rows_hash = int(pd.util.hash_pandas_object(df, index=True).sum())
+    return hash_parts(stable_repr(list(df.columns)), stable_repr([str(dtype) for dtype in df.dtypes]),
+                      str(len(df)), str(rows_hash))
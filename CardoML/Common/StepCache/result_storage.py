@@ -0,0 +1,210 @@
+import json
+import os
+import shutil
+import time
+from abc import ABCMeta, abstractmethod
+from typing import Iterable, List, Tuple
+
+import pandas as pd
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from CardoExecutor.Contract.CardoContextBase import CardoContextBase
+from CardoLibs.IO import HdfsReader, HdfsWriter
+
+DATA_DIRECTORY = 'data'
+PANDAS_FILE = 'data.parquet'
+META_FILE = '_cardo_meta.json'
+
+
+class IResultStorage(metaclass=ABCMeta):
+    """
+    Where the step cache keeps its results. every result is a parquet output stored under a key, with a small meta
+    file that is written last (so a result without it is incomplete) and touched whenever the result is used.
+    """
+    def __init__(self, root: str, max_bytes: int = None):
+        """
+        :param root: the directory that holds all the results
+        :param max_bytes: evict the least recently used results when the stored results are bigger than that
+        """
+        self.root = root.rstrip('/')
+        self.max_bytes = max_bytes
+
+    def path(self, key: str) -> str:
+        return '{}/{}'.format(self.root, key)
+
+    @abstractmethod
+    def exists(self, cardo_context: CardoContextBase, key: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def write(self, cardo_context: CardoContextBase, key: str, cardo_dataframe: CardoDataFrame) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def read(self, cardo_context: CardoContextBase, key: str) -> CardoDataFrame:
+        raise NotImplementedError
+
+    @abstractmethod
+    def touch(self, cardo_context: CardoContextBase, key: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, cardo_context: CardoContextBase, key: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def move(self, cardo_context: CardoContextBase, key: str, new_key: str) -> None:
+        """
+        Replace the result of new_key by the result of key, with a rename instead of a copy
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def entries(self, cardo_context: CardoContextBase) -> List[Tuple[str, int, float]]:
+        """
+        :return: (key, size in bytes, last used time) of every complete result
+        """
+        raise NotImplementedError
+
+    def evict(self, cardo_context: CardoContextBase, keep: Iterable[str] = ()) -> List[str]:
+        """
+        Delete the least recently used results until the storage fits in max_bytes.
+        :param keep: keys that must not be deleted
+        :return: the deleted keys
+        """
+        if self.max_bytes is None:
+            return []
+        entries = sorted(self.entries(cardo_context), key=lambda entry: entry[2])
+        total_bytes = sum(size for _, size, _ in entries)
+        evicted = []
+        for key, size, _ in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            if key in keep:
+                continue
+            self.delete(cardo_context, key)
+            total_bytes -= size
+            evicted.append(key)
+        return evicted
+
+    @staticmethod
+    def _meta(cardo_dataframe: CardoDataFrame) -> str:
+        return json.dumps({'payload_type': cardo_dataframe.payload_type,
+                           'table_name': cardo_dataframe.table_name,
+                           'created': time.time()})
+
+
+class LocalResultStorage(IResultStorage):
+    """
+    Keep the results in a local directory, for tests and for spark running in local mode.
+    """
+    def exists(self, cardo_context: CardoContextBase, key: str) -> bool:
+        return os.path.exists(os.path.join(self.path(key), META_FILE))
+
+    def write(self, cardo_context: CardoContextBase, key: str, cardo_dataframe: CardoDataFrame) -> None:
+        self.delete(cardo_context, key)
+        os.makedirs(self.path(key))
+        if cardo_dataframe.payload_type == 'pandas':
+            cardo_dataframe.dataframe.to_parquet(os.path.join(self.path(key), PANDAS_FILE))
+        else:
+            cardo_dataframe.dataframe.write.parquet('file://{}'.format(os.path.abspath(self.__data_path(key))))
+        with open(os.path.join(self.path(key), META_FILE), 'w') as meta_file:
+            meta_file.write(self._meta(cardo_dataframe))
+
+    def read(self, cardo_context: CardoContextBase, key: str) -> CardoDataFrame:
+        with open(os.path.join(self.path(key), META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+        if meta['payload_type'] == 'pandas':
+            dataframe = pd.read_parquet(os.path.join(self.path(key), PANDAS_FILE))
+        else:
+            dataframe = cardo_context.spark.read.parquet('file://{}'.format(os.path.abspath(self.__data_path(key))))
+        return CardoDataFrame(dataframe, meta['table_name'])
+
+    def touch(self, cardo_context: CardoContextBase, key: str) -> None:
+        os.utime(os.path.join(self.path(key), META_FILE))
+
+    def delete(self, cardo_context: CardoContextBase, key: str) -> None:
+        shutil.rmtree(self.path(key), ignore_errors=True)
+
+    def move(self, cardo_context: CardoContextBase, key: str, new_key: str) -> None:
+        self.delete(cardo_context, new_key)
+        os.rename(self.path(key), self.path(new_key))
+
+    def entries(self, cardo_context: CardoContextBase) -> List[Tuple[str, int, float]]:
+        if not os.path.isdir(self.root):
+            return []
+        entries = []
+        for key in os.listdir(self.root):
+            if self.exists(cardo_context, key):
+                size = sum(os.path.getsize(os.path.join(directory, file_name))
+                           for directory, _, file_names in os.walk(self.path(key)) for file_name in file_names)
+                entries.append((key, size, os.path.getmtime(os.path.join(self.path(key), META_FILE))))
+        return entries
+
+    def __data_path(self, key: str) -> str:
+        return os.path.join(self.path(key), DATA_DIRECTORY)
+
+
+class HdfsResultStorage(IResultStorage):
+    """
+    Keep the results on HDFS (or any hadoop filesystem), through the spark context's hadoop FileSystem.
+    """
+    def exists(self, cardo_context: CardoContextBase, key: str) -> bool:
+        return self.__file_system(cardo_context).exists(self.__hadoop_path(cardo_context, key, META_FILE))
+
+    def write(self, cardo_context: CardoContextBase, key: str, cardo_dataframe: CardoDataFrame) -> None:
+        self.delete(cardo_context, key)
+        HdfsWriter('{}/{}'.format(self.path(key), DATA_DIRECTORY), 'overwrite', 'parquet').process(cardo_context,
+                                                                                                  cardo_dataframe)
+        stream = self.__file_system(cardo_context).create(self.__hadoop_path(cardo_context, key, META_FILE), True)
+        try:
+            stream.write(bytearray(self._meta(cardo_dataframe).encode('utf-8')))
+        finally:
+            stream.close()
+
+    def read(self, cardo_context: CardoContextBase, key: str) -> CardoDataFrame:
+        jvm = cardo_context.spark.sparkContext._jvm
+        stream = self.__file_system(cardo_context).open(self.__hadoop_path(cardo_context, key, META_FILE))
+        try:
+            meta = json.loads(jvm.org.apache.commons.io.IOUtils.toString(stream, 'UTF-8'))
+        finally:
+            stream.close()
+        cardo_dataframe = HdfsReader('{}/{}'.format(self.path(key), DATA_DIRECTORY), 'parquet').process(cardo_context)
+        if meta['payload_type'] == 'pandas':
+            cardo_dataframe = CardoDataFrame(cardo_dataframe.dataframe.toPandas())
+        cardo_dataframe.table_name = meta['table_name']
+        return cardo_dataframe
+
+    def touch(self, cardo_context: CardoContextBase, key: str) -> None:
+        self.__file_system(cardo_context).setTimes(self.__hadoop_path(cardo_context, key, META_FILE),
+                                                   int(time.time() * 1000), -1)
+
+    def delete(self, cardo_context: CardoContextBase, key: str) -> None:
+        self.__file_system(cardo_context).delete(self.__hadoop_path(cardo_context, key), True)
+
+    def move(self, cardo_context: CardoContextBase, key: str, new_key: str) -> None:
+        self.delete(cardo_context, new_key)
+        if not self.__file_system(cardo_context).rename(self.__hadoop_path(cardo_context, key),
+                                                        self.__hadoop_path(cardo_context, new_key)):
+            raise IOError('failed to move {} to {}'.format(self.path(key), self.path(new_key)))
+
+    def entries(self, cardo_context: CardoContextBase) -> List[Tuple[str, int, float]]:
+        file_system = self.__file_system(cardo_context)
+        root = cardo_context.spark.sparkContext._jvm.org.apache.hadoop.fs.Path(self.root)
+        if not file_system.exists(root):
+            return []
+        entries = []
+        for status in file_system.listStatus(root):
+            key = status.getPath().getName()
+            meta_path = self.__hadoop_path(cardo_context, key, META_FILE)
+            if file_system.exists(meta_path):
+                entries.append((key, file_system.getContentSummary(status.getPath()).getLength(),
+                                file_system.getFileStatus(meta_path).getModificationTime() / 1000))
+        return entries
+
+    def __hadoop_path(self, cardo_context: CardoContextBase, key: str, *children: str):
+        return cardo_context.spark.sparkContext._jvm.org.apache.hadoop.fs.Path('/'.join([self.path(key), *children]))
+
+    def __file_system(self, cardo_context: CardoContextBase):
+        spark_context = cardo_context.spark.sparkContext
+        return spark_context._jvm.org.apache.hadoop.fs.Path(self.root).getFileSystem(
+            spark_context._jsc.hadoopConfiguration())
@@ -0,0 +1,64 @@
+import functools
+from collections import defaultdict
+from threading import Lock
+from typing import Callable, Dict
+
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from CardoExecutor.Contract.CardoContextBase import CardoContextBase
+from CardoExecutor.Contract.IStep import IStep
+
+from .fingerprint import dataframe_fingerprint, hash_parts, step_fingerprint
+from .result_storage import IResultStorage
+
+__key_locks = defaultdict(Lock)  # type: Dict[str, Lock]
+__key_locks_lock = Lock()
+
+
+def step_cache(storage: IResultStorage, version: str = '') -> Callable:
+    """
+    Cache the output of a step, keyed by a fingerprint of the step (class, code, constructor arguments) and of its
+    input dataframes (schema and content). a hit returns the stored parquet output without running the step,
+    a miss runs the step and stores its output.
+
+    Usage Examples:
+        1)
+        class ExampleStep(IStep):
+            @step_cache(HdfsResultStorage("/user/cardo/step_cache", max_bytes=10 * 1024 ** 4))
+            def process(self, cardo_context, cardo_dataframe):
+                ...
+                return cardo_dataframe
+
+        2)
+            a_step = MyStep(...)
+            new_process = step_cache(LocalResultStorage("/tmp/step_cache"))(MyStep.process)
+            new_process(a_step, context, cardo_dataframe)
+
+    :param storage: where to keep the results
+    :param version: change it to invalidate the results of the step without changing its code
+    """
+    def wrapper(func: Callable):
+        @functools.wraps(func)
+        def inner(self: IStep, cardo_context: CardoContextBase, *cardo_dataframes: CardoDataFrame) -> CardoDataFrame:
+            key = hash_parts(step_fingerprint(self), func.__qualname__, version,
+                             *[dataframe_fingerprint(cardo_context, cardo_dataframe)
+                               for cardo_dataframe in cardo_dataframes])
+            with __key_lock(storage.path(key)):  # a concurrent miss on the same key waits and then hits
+                if storage.exists(cardo_context, key):
+                    cardo_context.logger.info('step cache hit for {}: {}'.format(self.__class__.__name__,
+                                                                                 storage.path(key)))
+                    storage.touch(cardo_context, key)
+                    return storage.read(cardo_context, key)
+
+                cardo_context.logger.info('step cache miss for {}: {}'.format(self.__class__.__name__,
+                                                                              storage.path(key)))
+                storage.write(cardo_context, key, func(self, cardo_context, *cardo_dataframes))
+                for evicted_key in storage.evict(cardo_context, keep=[key]):
+                    cardo_context.logger.info('step cache evicted: {}'.format(storage.path(evicted_key)))
+                return storage.read(cardo_context, key)
+        return inner
+    return wrapper
+
+
+def __key_lock(path: str) -> Lock:
+    with __key_locks_lock:
+        return __key_locks[path]
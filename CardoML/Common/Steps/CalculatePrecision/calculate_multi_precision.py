@@ -0,0 +1,165 @@
+import functools
+from typing import Dict, List, Tuple
+
+import pyspark.sql.dataframe as SparkDataFrame
+import pyspark.sql.functions as F
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from CardoExecutor.Contract.CardoContextBase import CardoContextBase
+from CardoExecutor.Contract.IStep import IStep
+
+from CardoML.Common.StepCache.fingerprint import hash_parts, stable_repr
+from CardoML.Common.StepCache.result_storage import IResultStorage
+from .precision_state import MATCHES, PAIRS, update_precision_state
+
+PAIR_COLUMN = 'tmp_pair'
+KEY_COLUMN = 'tmp_key'
+MATCH_COLUMN = 'tmp_match'
+GT_MATCH_COLUMN = 'tmp_gt_match'
+LABEL_COLUMN = 'tmp_label'
+COUNT_COLUMN = 'tmp_count'
+TRUE_POSITIVE_COLUMN = 'tmp_true_positive'
+ANY_TRUE_POSITIVE_COLUMN = 'tmp_any_true_positive'
+ALL_POSITIVES = 'all_positives'
+TRUE_POSITIVES = 'true_positives'
+FRIENDLY_TRUE_POSITIVES = 'friendly_true_positives'
+
+
+class CalculateMultiPrecision(IStep):
+	"""
+	Calculate the strict and friendly precision of several (intersection_column, match_column) pairs with one join
+	against the ground truth and one aggregation. Logs the same records as a `CalculatePrecision` for every pair and
+	variant, in the order of `column_pairs` (strict before friendly).
+
+	Parameters
+	----------
+	column_pairs : List[Tuple[str, str]]
+		(intersection_column, match_column) pairs, see `CalculatePrecision`.
+
+	strict_precision : bool, default True
+		whether to calculate the strict precision of every pair.
+
+	friendly_precision : bool, default True
+		whether to calculate the friendly precision of every pair.
+
+	source_name : str, default None
+		the source name for the logs. if none is given use the `table_name` property of the CardoDataFrame
+
+	precision_column : str, default None
+		if given keep the precision calculated as a column under the name given (the last variant calculated wins).
+
+	log_type : str, default `visualize`
+		the name of the `log_type` field in the logger for the strict precision.
+
+	friendly_log_type : str, default None
+		the name of the `log_type` field in the logger for the friendly precision. if none is given use `log_type`.
+
+	state_storage : IResultStorage, default None
+		if given, calculate incrementally like `CalculatePrecision`: the joined pairs and matches of every
+		(pair, key) are kept in the storage, and only the keys whose rows changed since the previous run are joined
+		again.
+	"""
+	def __init__(self,
+				 column_pairs: List[Tuple[str, str]],
+				 strict_precision: bool = True,
+				 friendly_precision: bool = True,
+				 source_name: str = None,
+				 precision_column: str = None,
+				 log_type: str = 'visualize',
+				 friendly_log_type: str = None,
+				 state_storage: IResultStorage = None):
+		self.column_pairs = column_pairs
+		self.strict_precision = strict_precision
+		self.friendly_precision = friendly_precision
+		self.source_name = source_name
+		self.precision_column = precision_column
+		self.log_type = log_type
+		self.friendly_log_type = friendly_log_type if friendly_log_type else log_type
+		self.state_storage = state_storage
+
+	def __key_match_pairs(self, dataframe: SparkDataFrame) -> SparkDataFrame:
+		return functools.reduce(lambda df1, df2: df1.union(df2),
+								[dataframe.select(F.lit(index).alias(PAIR_COLUMN),
+												  F.col(intersection_column).alias(KEY_COLUMN),
+												  F.col(match_column).alias(MATCH_COLUMN))
+								 for index, (intersection_column, match_column) in enumerate(self.column_pairs)])
+
+	def __get_intersections(self, dataframe: SparkDataFrame,
+							ground_truth: SparkDataFrame) -> Dict[int, Dict[str, int]]:
+		intersected = self.__key_match_pairs(dataframe).join(
+			self.__key_match_pairs(ground_truth).withColumnRenamed(MATCH_COLUMN, GT_MATCH_COLUMN),
+			[PAIR_COLUMN, KEY_COLUMN])
+		intersected = intersected.withColumn(LABEL_COLUMN, F.when(F.col(MATCH_COLUMN) == F.col(GT_MATCH_COLUMN), 1)
+											 .otherwise(0))
+		groups = intersected.groupBy(PAIR_COLUMN, KEY_COLUMN).agg(F.count(F.lit(1)).alias(COUNT_COLUMN),
+																   F.sum(LABEL_COLUMN).alias(TRUE_POSITIVE_COLUMN),
+																   F.max(LABEL_COLUMN).alias(ANY_TRUE_POSITIVE_COLUMN))
+		totals = groups.groupBy(PAIR_COLUMN).agg(
+			F.sum(COUNT_COLUMN).alias(ALL_POSITIVES),
+			F.sum(TRUE_POSITIVE_COLUMN).alias(TRUE_POSITIVES),
+			F.sum(F.col(COUNT_COLUMN) * F.col(ANY_TRUE_POSITIVE_COLUMN)).alias(FRIENDLY_TRUE_POSITIVES)).collect()
+		counts = {index: {ALL_POSITIVES: 0, TRUE_POSITIVES: 0, FRIENDLY_TRUE_POSITIVES: 0}
+				  for index in range(len(self.column_pairs))}
+		for row in totals:
+			counts[row[PAIR_COLUMN]] = {ALL_POSITIVES: row[ALL_POSITIVES],
+										TRUE_POSITIVES: row[TRUE_POSITIVES],
+										FRIENDLY_TRUE_POSITIVES: row[FRIENDLY_TRUE_POSITIVES]}
+		return counts
+
+	def __get_incremental_intersections(self, cardo_context: CardoContextBase, dataframe: SparkDataFrame,
+										ground_truth: SparkDataFrame, state_key: str) -> Dict[int, Dict[str, int]]:
+		state = update_precision_state(cardo_context, self.state_storage, state_key,
+									   self.__key_match_pairs(dataframe), self.__key_match_pairs(ground_truth),
+									   [PAIR_COLUMN, KEY_COLUMN], MATCH_COLUMN)
+		totals = state.groupBy(PAIR_COLUMN).agg(
+			F.sum(PAIRS).alias(ALL_POSITIVES),
+			F.sum(MATCHES).alias(TRUE_POSITIVES),
+			F.sum(F.when(F.col(MATCHES) > 0, F.col(PAIRS)).otherwise(0)).alias(FRIENDLY_TRUE_POSITIVES)).collect()
+		counts = {index: {ALL_POSITIVES: 0, TRUE_POSITIVES: 0, FRIENDLY_TRUE_POSITIVES: 0}
+				  for index in range(len(self.column_pairs))}
+		for row in totals:
+			counts[row[PAIR_COLUMN]] = {ALL_POSITIVES: int(row[ALL_POSITIVES]),
+										TRUE_POSITIVES: int(row[TRUE_POSITIVES]),
+										FRIENDLY_TRUE_POSITIVES: int(row[FRIENDLY_TRUE_POSITIVES])}
+		return counts
+
+	def __state_key(self, source_name: str, gt: CardoDataFrame) -> str:
+		return hash_parts(self.__class__.__name__, str(source_name), str(gt.table_name), stable_repr(self.column_pairs))
+
+	@staticmethod
+	def __get_precision_value(true_positive_count: int, all_positives_count: int) -> float:
+		return 0 if all_positives_count == 0 else true_positive_count / all_positives_count
+
+	def __variants(self) -> List[bool]:
+		return [friendly for friendly, calculate in [(False, self.strict_precision), (True, self.friendly_precision)]
+				if calculate]
+
+	def process(self, cardo_context: CardoContextBase, cardo_dataframe: CardoDataFrame,
+				gt: CardoDataFrame) -> CardoDataFrame:
+		dataframe = cardo_dataframe.dataframe
+		source_name = self.source_name if self.source_name else cardo_dataframe.table_name
+		if self.state_storage is None:
+			counts = self.__get_intersections(dataframe, gt.dataframe)
+		else:
+			counts = self.__get_incremental_intersections(cardo_context, dataframe, gt.dataframe,
+														  self.__state_key(source_name, gt))
+		for index, (intersection_column, match_column) in enumerate(self.column_pairs):
+			for is_friendly in self.__variants():
+				all_positives_count = counts[index][ALL_POSITIVES]
+				true_positive_count = counts[index][FRIENDLY_TRUE_POSITIVES if is_friendly else TRUE_POSITIVES]
+				precision_value = self.__get_precision_value(true_positive_count, all_positives_count)
+				if self.precision_column:
+					dataframe = dataframe.withColumn(self.precision_column, F.lit(precision_value))
+				cardo_context.logger.info(f"precision calculation for {source_name} -> "
+										  f"matches: {true_positive_count}, intersection: {all_positives_count}, "
+										  f"precision: {precision_value}, "
+										  f"is friendly: {is_friendly}",
+										  extra={"gt_match": true_positive_count,
+												 "id": f"{match_column}_for_{intersection_column}_{gt.table_name}",
+												 "log_type": self.friendly_log_type if is_friendly else self.log_type,
+												 "count": all_positives_count,
+												 "statistic_value": precision_value,
+												 "statistic_type": "precision",
+												 "table_name": source_name,
+												 "base_table": gt.table_name})
+		cardo_dataframe.dataframe = dataframe
+		return cardo_dataframe
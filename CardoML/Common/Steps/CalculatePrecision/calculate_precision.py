@@ -7,6 +7,10 @@ from CardoExecutor.Contract.CardoContextBase import CardoContextBase
 from CardoExecutor.Contract.IStep import IStep
 from pyspark.sql.window import Window
 
+from CardoML.Common.StepCache.fingerprint import hash_parts
+from CardoML.Common.StepCache.result_storage import IResultStorage
+from .precision_state import MATCHES, PAIRS, update_precision_state
+
 
 class CalculatePrecision(IStep):
 	"""
@@ -29,6 +33,10 @@ class CalculatePrecision(IStep):
 
 	log_type : str, default `visualize`
 		the name of the `log_type` field in the logger, can used to filter logs for visualization
+
+	state_storage : IResultStorage, default None
+		if given, calculate incrementally: the joined pairs and matches of every `intersection_column` key are kept
+		in the storage, and only the keys whose rows changed since the previous run (on either side) are joined again.
 	"""
 	def __init__(self,
 				 intersection_column: str,
@@ -36,13 +44,15 @@ class CalculatePrecision(IStep):
 				 source_name: str = None,
 				 friendly_precision: bool = False,
 				 precision_column: str = None,
-				 log_type: str = 'visualize'):
+				 log_type: str = 'visualize',
+				 state_storage: IResultStorage = None):
 		self.intersection_column = intersection_column
 		self.match_column = match_column
 		self.precision_column = precision_column
 		self.friendly_precision = friendly_precision
 		self.source_name = source_name
 		self.log_type = log_type
+		self.state_storage = state_storage
 
 	def __get_intersections(self, dataframe: SparkDataFrame, ground_truth: SparkDataFrame) -> Tuple[int, int]:
 		tmp_label = 'tmp_label'
@@ -62,6 +72,19 @@ class CalculatePrecision(IStep):
 		intersected.unpersist()
 		return true_positive_count, all_positives_count
 
+	def __get_incremental_intersections(self, cardo_context: CardoContextBase, dataframe: SparkDataFrame,
+										ground_truth: SparkDataFrame, state_key: str) -> Tuple[int, int]:
+		state = update_precision_state(cardo_context, self.state_storage, state_key, dataframe, ground_truth,
+									   [self.intersection_column], self.match_column)
+		true_positive = F.when(F.col(MATCHES) > 0, F.col(PAIRS)).otherwise(0) if self.friendly_precision \
+			else F.col(MATCHES)
+		all_positives_count, true_positive_count = state.agg(F.sum(PAIRS), F.sum(true_positive)).first()
+		return int(true_positive_count or 0), int(all_positives_count or 0)
+
+	def __state_key(self, source_name: str, gt: CardoDataFrame) -> str:
+		return hash_parts(self.__class__.__name__, str(source_name), str(gt.table_name), self.intersection_column,
+						  self.match_column)
+
 	@staticmethod
 	def __get_precision_value(true_positive_count: int, all_positives_count: int) -> float:
 		return 0 if all_positives_count == 0 else true_positive_count / all_positives_count
@@ -70,11 +93,15 @@ class CalculatePrecision(IStep):
 				gt: CardoDataFrame) -> CardoDataFrame:
 		dataframe = cardo_dataframe.dataframe
 		ground_truth_dataframe = gt.dataframe
-		true_positive_count, all_positives_count = self.__get_intersections(dataframe, ground_truth_dataframe)
+		source_name = self.source_name if self.source_name else cardo_dataframe.table_name
+		if self.state_storage is None:
+			true_positive_count, all_positives_count = self.__get_intersections(dataframe, ground_truth_dataframe)
+		else:
+			true_positive_count, all_positives_count = self.__get_incremental_intersections(
+				cardo_context, dataframe, ground_truth_dataframe, self.__state_key(source_name, gt))
 		precision_value = self.__get_precision_value(true_positive_count, all_positives_count)
 		if self.precision_column:
 			cardo_dataframe.dataframe = dataframe.withColumn(self.precision_column, F.lit(precision_value))
-		source_name = self.source_name if self.source_name else cardo_dataframe.table_name
 		cardo_context.logger.info(f"precision calculation for {source_name} -> "
 								  f"matches: {true_positive_count}, intersection: {all_positives_count}, "
 								  f"precision: {precision_value}, "
@@ -0,0 +1,83 @@
+from typing import List
+
+import pyspark.sql.dataframe as SparkDataFrame
+import pyspark.sql.functions as F
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from CardoExecutor.Contract.CardoContextBase import CardoContextBase
+
+from CardoML.Common.StepCache.fingerprint import hash_parts
+from CardoML.Common.StepCache.result_storage import IResultStorage
+
+LOGIC_ROWS = 'logic_rows'
+LOGIC_HASH = 'logic_hash'
+GT_ROWS = 'gt_rows'
+GT_HASH = 'gt_hash'
+FINGERPRINT_COLUMNS = [LOGIC_ROWS, LOGIC_HASH, GT_ROWS, GT_HASH]
+PAIRS = 'pairs'
+MATCHES = 'matches'
+NEXT_STATE = 'next'
+
+
+def update_precision_state(cardo_context: CardoContextBase, state_storage: IResultStorage, state_key: str,
+						   dataframe: SparkDataFrame, ground_truth: SparkDataFrame, key_columns: List[str],
+						   match_column: str) -> SparkDataFrame:
+	"""
+	Keep the joined pairs and the matching pairs of every key in state_storage, and count only the keys whose rows
+	changed since the previous run (on either side) again.
+	The new state is written under a temporary key and moved over the previous one only once it is complete, so a
+	failed run leaves the previous state as it was.
+	:return: the new state, read from the storage: a row per key with its fingerprints, `pairs` and `matches`
+	"""
+	current = _key_fingerprints(dataframe, key_columns, match_column, LOGIC_ROWS, LOGIC_HASH).join(
+		_key_fingerprints(ground_truth, key_columns, match_column, GT_ROWS, GT_HASH), key_columns)
+	if state_storage.exists(cardo_context, state_key):
+		previous = state_storage.read(cardo_context, state_key).dataframe
+		joined = current.join(previous.select(*key_columns, *[F.col(column).alias('previous_' + column)
+															  for column in FINGERPRINT_COLUMNS + [PAIRS, MATCHES]]),
+							  key_columns, 'left')
+		is_unchanged = F.lit(True)
+		for column in FINGERPRINT_COLUMNS:
+			is_unchanged = is_unchanged & F.col(column).eqNullSafe(F.col('previous_' + column))
+		unchanged = joined.filter(is_unchanged).select(*key_columns, *FINGERPRINT_COLUMNS,
+													   F.col('previous_' + PAIRS).alias(PAIRS),
+													   F.col('previous_' + MATCHES).alias(MATCHES))
+		changed = joined.filter(~is_unchanged).select(*key_columns, *FINGERPRINT_COLUMNS)
+		state = unchanged.unionByName(_count_matches(dataframe, ground_truth, changed, key_columns, match_column))
+	else:
+		state = _count_matches(dataframe, ground_truth, current, key_columns, match_column)
+
+	next_key = hash_parts(state_key, NEXT_STATE)
+	state_storage.write(cardo_context, next_key, CardoDataFrame(state))
+	state_storage.move(cardo_context, next_key, state_key)
+	return state_storage.read(cardo_context, state_key).dataframe
+
+
+def _key_fingerprints(dataframe: SparkDataFrame, key_columns: List[str], match_column: str, rows_column: str,
+					   hash_column: str) -> SparkDataFrame:
+	"""
+	The rows count and an order independent hash of the match values of every key, a key whose rows changed gets
+	a different fingerprint
+	"""
+	not_null = F.lit(True)
+	for column in key_columns:
+		not_null = not_null & F.col(column).isNotNull()
+	return dataframe.filter(not_null) \
+		.groupBy(*key_columns) \
+		.agg(F.count(F.lit(1)).alias(rows_column),
+			 F.sum(F.xxhash64(match_column).cast('decimal(38,0)')).alias(hash_column))
+
+
+def _count_matches(dataframe: SparkDataFrame, ground_truth: SparkDataFrame, keys: SparkDataFrame,
+					key_columns: List[str], match_column: str) -> SparkDataFrame:
+	"""
+	The joined pairs (logic rows * gt rows) and the matching pairs of the given keys, without joining row by row
+	"""
+	match_counts = [side.join(keys.select(*key_columns), key_columns, 'left_semi')
+					.groupBy(*key_columns, match_column)
+					.agg(F.count(F.lit(1)).alias(rows_column))
+					for side, rows_column in [(dataframe, LOGIC_ROWS), (ground_truth, GT_ROWS)]]
+	matches = match_counts[0].join(match_counts[1], [*key_columns, match_column]) \
+		.groupBy(*key_columns).agg(F.sum(F.col(LOGIC_ROWS) * F.col(GT_ROWS)).alias(MATCHES))
+	return keys.join(matches, key_columns, 'left').select(*key_columns, *FINGERPRINT_COLUMNS,
+														  (F.col(LOGIC_ROWS) * F.col(GT_ROWS)).alias(PAIRS),
+														  F.coalesce(F.col(MATCHES), F.lit(0)).alias(MATCHES))
@@ -1,2 +1,3 @@
 from .id_counts import IdCounts
-from .intersection import Intersection
\ No newline at end of file
+from .intersection import Intersection
+from .logic_statistics import LogicStatistics
@@ -0,0 +1,83 @@
+from typing import List
+
+import pyspark.sql.functions as F
+from CardoExecutor.Common.CardoContext import CardoContextBase
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from CardoExecutor.Contract.IStep import IStep
+from pyspark.sql import Column, DataFrame as SparkDataFrame
+
+ROWS_COLUMN = 'tmp_rows'
+DISTINCT_COLUMN = 'tmp_distinct_{}'
+INTERSECTION_COLUMN = 'tmp_intersection_{}'
+KEY_COUNT_COLUMN = 'tmp_key_count'
+DATASET_KEY_COUNT_COLUMN = 'tmp_dataset_key_count'
+
+
+class LogicStatistics(IStep):
+	"""
+	log the rows count, the distinct count of every id and the ids intersection count with every given dataset
+	to elastic, all computed by a single spark job.
+	logs the same records as `IdCounts` and `Intersection`.
+
+	Parameters
+	----------
+	ids : List
+		the id columns to count, and to intersect the datasets on.
+
+	log_name : str, default `gt_intersections`
+		the `statistic_type` of the intersection logs.
+
+	approximate : bool, default False
+		use HyperLogLog (`approx_count_distinct`) for the distinct counts.
+
+	relative_error : float, default 0.05
+		maximum relative standard deviation allowed for the approximate distinct counts.
+	"""
+
+	def __init__(self, ids: List, log_name: str = 'gt_intersections', approximate: bool = False,
+				 relative_error: float = 0.05) -> None:
+		self.ids = ids
+		self.log_name = log_name
+		self.approximate = approximate
+		self.relative_error = relative_error
+
+	def process(self, cardo_context: CardoContextBase, dataframe: CardoDataFrame,
+				*intersection_datasets: CardoDataFrame) -> CardoDataFrame:
+		statistics = self.__statistics(dataframe, intersection_datasets)
+		cardo_context.logger.info('id_counts', extra={'table_name': dataframe.table_name,
+													  'statistic_type': 'id_counts',
+													  'statistic_value': statistics[ROWS_COLUMN]})
+		for index, id_name in enumerate(self.ids):
+			cardo_context.logger.info('id_distinct_counts', extra={'table_name': dataframe.table_name,
+																   'statistic_type': id_name,
+																   'statistic_value': statistics[DISTINCT_COLUMN.format(index)]})
+		for index, intersection_dataset in enumerate(intersection_datasets):
+			cardo_context.logger.info(self.log_name, extra={'table_name': intersection_dataset.table_name,
+															'statistic_type': self.log_name,
+															'statistic_value': statistics[INTERSECTION_COLUMN.format(index)]})
+		return dataframe
+
+	def __statistics(self, dataframe: CardoDataFrame, intersection_datasets: List[CardoDataFrame]) -> dict:
+		df = dataframe.dataframe
+		statistics = df.agg(F.count(F.lit(1)).alias(ROWS_COLUMN),
+							*[self.__distinct_count(id_name).alias(DISTINCT_COLUMN.format(index))
+							  for index, id_name in enumerate(self.ids)])
+		if intersection_datasets:
+			keys_counts = df.groupBy(self.ids).agg(F.count(F.lit(1)).alias(KEY_COUNT_COLUMN))
+			for index, intersection_dataset in enumerate(intersection_datasets):
+				statistics = statistics.crossJoin(self.__intersect(keys_counts, intersection_dataset,
+																   INTERSECTION_COLUMN.format(index)))
+		return statistics.collect()[0].asDict()
+
+	def __distinct_count(self, id_name: str) -> Column:
+		if self.approximate:
+			return F.approx_count_distinct(id_name, rsd=self.relative_error)
+		return F.countDistinct(id_name)
+
+	def __intersect(self, keys_counts: SparkDataFrame, dataset: CardoDataFrame, column_name: str) -> SparkDataFrame:
+		"""
+		the join row count of dataframe and dataset, summed from the key counts of both sides instead of joining rows
+		"""
+		dataset_keys_counts = dataset.dataframe.groupBy(self.ids).agg(F.count(F.lit(1)).alias(DATASET_KEY_COUNT_COLUMN))
+		return keys_counts.join(dataset_keys_counts, on=self.ids) \
+			.agg(F.coalesce(F.sum(F.col(KEY_COUNT_COLUMN) * F.col(DATASET_KEY_COUNT_COLUMN)), F.lit(0)).alias(column_name))
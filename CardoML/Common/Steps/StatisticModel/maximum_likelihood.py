@@ -6,13 +6,24 @@ from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
 from CardoExecutor.Contract.IStep import IStep
 from pyspark.sql import dataframe
 
-from CardoML.Common.Core.core import union_dataframes
+from CardoML.Common.Core.core import pandas_to_spark, union_dataframes
+from CardoML.Common.Steps.StatisticModel.pandas_maximum_likelihood import combine_pandas_sources
+
+SALT_COLUMN = 'tmp_salt'
+PARTIAL_COLUMN = '{col}__{agg}'
+SIMPLE_AGGREGATIONS = ['sum', 'max', 'min', 'first', 'last']
 
 
 class MaximumLikelihood(IStep):
     def __init__(self, group_by_cols, grade_cols, aggregations, log_value_for_ones=math.log(0.00001), allow_ones=False,
-                 replace_ones=0.9999, concat_ws_seperator=', '):
-        # type: (list,list,dict,float,bool,bool,str) -> None
+                 replace_ones=0.9999, concat_ws_seperator=', ', salt_buckets=None, pre_aggregate=False):
+        # type: (list,list,dict,float,bool,bool,str,int,bool) -> None
+        """
+        :param salt_buckets: aggregate in two stages, first by the group_by_cols and a salt of that many buckets,
+            so hot keys are spread over many tasks
+        :param pre_aggregate: aggregate every source before the union (cheap when the sources are already partitioned
+            by the group_by_cols), then merge the partial aggregations
+        """
         self.group_by_cols = group_by_cols
         self.grade_cols = grade_cols
         self.aggregations = aggregations
@@ -20,14 +31,27 @@ class MaximumLikelihood(IStep):
         self.allow_ones = allow_ones
         self.replace_ones = replace_ones
         self.concat_ws_seperator = concat_ws_seperator
+        self.salt_buckets = salt_buckets
+        self.pre_aggregate = pre_aggregate
 
     def process(self, cardo_context, *dataframes):
         # type: (CardoContextBase,list) -> CardoDataFrame
-        df = union_dataframes(dataframes)
-        df = df.dataframe
-
-        df = self.get_log_of_grades(df)
-        df = self.combine_sources(df)
+        if all(cardo_dataframe.payload_type == 'pandas' for cardo_dataframe in dataframes):
+            return CardoDataFrame(combine_pandas_sources(
+                union_dataframes(dataframes).dataframe, self.group_by_cols, self.grade_cols, self.aggregations,
+                self.log_value_for_ones, self.allow_ones, self.replace_ones, self.concat_ws_seperator))
+        if self.pre_aggregate:
+            partials = [CardoDataFrame(self.partial_combine_sources(self.get_log_of_grades(
+                self.__spark_dataframe(cardo_context, cardo_dataframe)))) for cardo_dataframe in dataframes]
+            df = self.final_combine_sources(union_dataframes(partials).dataframe)
+        else:
+            df = union_dataframes(dataframes).dataframe
+            df = self.get_log_of_grades(df)
+            if self.salt_buckets:
+                df = df.withColumn(SALT_COLUMN, F.pmod(F.monotonically_increasing_id(), F.lit(self.salt_buckets)))
+                df = self.final_combine_sources(self.partial_combine_sources(df, [SALT_COLUMN]))
+            else:
+                df = self.combine_sources(df)
         df = self.convert_grade_back_to_normal(df)
         if not self.allow_ones:
             df = self.fix_ones(df)
@@ -36,34 +60,83 @@ class MaximumLikelihood(IStep):
 
     def get_log_of_grades(self, df):
         # type: (dataframe) -> dataframe
-        for col in self.grade_cols:
-            df = df.withColumn(col, F.coalesce(F.log(F.lit(1) - F.col(col)), F.lit(self.log_value_for_ones)))
-        return df
+        return self.__select_grades(df, lambda col: F.coalesce(F.log(F.lit(1) - F.col(col)),
+                                                               F.lit(self.log_value_for_ones)))
 
     def combine_sources(self, df):
         # type: (dataframe) -> dataframe
-        concat_ws = []
-        for col, agg in self.aggregations.items():
-            if agg == 'concat_ws':
-                concat_ws.append(col)
-                self.aggregations[col] = 'collect_set'
+        return df.groupBy(self.group_by_cols).agg(*[self.__aggregation(col, agg)
+                                                    for col, agg in self.aggregations.items()])
 
-        df = df.groupBy(self.group_by_cols).agg(self.aggregations)
-        for col, agg in self.aggregations.items():
-            df = df.withColumnRenamed("{agg}({col})".format(agg=agg, col=col), col)
+    def partial_combine_sources(self, df, extra_group_by_cols=()):
+        # type: (dataframe,list) -> dataframe
+        """
+        First stage of combine_sources, the result can be unioned with other partial results and merged by
+        final_combine_sources
+        """
+        return df.groupBy(*self.group_by_cols, *extra_group_by_cols).agg(
+            *[partial for col, agg in self.aggregations.items() for partial in self.__partial_aggregations(col, agg)])
 
-        for col in concat_ws:
-            df = df.withColumn(col, F.concat_ws(self.concat_ws_seperator, col))
-        return df
+    def final_combine_sources(self, df):
+        # type: (dataframe) -> dataframe
+        return df.groupBy(self.group_by_cols).agg(*[self.__final_aggregation(col, agg)
+                                                    for col, agg in self.aggregations.items()])
 
     def convert_grade_back_to_normal(self, df):
         # type: (dataframe) -> dataframe
-        for col in self.grade_cols:
-            df = df.withColumn(col, F.lit(1) - F.exp(F.col(col)))
-        return df
+        return self.__select_grades(df, lambda col: F.lit(1) - F.exp(F.col(col)))
 
     def fix_ones(self, df):
         # type: (dataframe) -> dataframe
-        for col in self.grade_cols:
-            df = df.withColumn(col, F.when(F.col(col) == 1, self.replace_ones).otherwise(F.col(col)))
-        return df
+        return self.__select_grades(df, lambda col: F.when(F.col(col) == 1, self.replace_ones).otherwise(F.col(col)))
+
+    @staticmethod
+    def __spark_dataframe(cardo_context, cardo_dataframe):
+        # type: (CardoContextBase,CardoDataFrame) -> dataframe
+        """
+        A pandas source is converted to spark (through arrow) so it can be pre aggregated with the spark sources
+        """
+        if cardo_dataframe.payload_type == 'rdd':
+            return cardo_dataframe.dataframe.toDF()
+        if cardo_dataframe.payload_type != 'pandas':
+            return cardo_dataframe.dataframe
+        return pandas_to_spark(cardo_dataframe.dataframe, cardo_context.spark)
+
+    def __select_grades(self, df, grade_expression):
+        return df.select([grade_expression(col).alias(col) if col in self.grade_cols else F.col(col)
+                          for col in df.columns])
+
+    def __aggregation(self, col, agg):
+        if agg == 'concat_ws':
+            return F.concat_ws(self.concat_ws_seperator, F.collect_set(col)).alias(col)
+        return F.expr('{agg}(`{col}`)'.format(agg=agg, col=col)).alias(col)
+
+    @staticmethod
+    def __partial_aggregations(col, agg):
+        if agg in SIMPLE_AGGREGATIONS:
+            return [getattr(F, agg)(col).alias(PARTIAL_COLUMN.format(col=col, agg=agg))]
+        if agg == 'count':
+            return [F.count(col).alias(PARTIAL_COLUMN.format(col=col, agg='count'))]
+        if agg in ['avg', 'mean']:
+            return [F.sum(col).alias(PARTIAL_COLUMN.format(col=col, agg='sum')),
+                    F.count(col).alias(PARTIAL_COLUMN.format(col=col, agg='count'))]
+        if agg in ['collect_set', 'concat_ws']:
+            return [F.collect_set(col).alias(PARTIAL_COLUMN.format(col=col, agg='collect_set'))]
+        if agg == 'collect_list':
+            return [F.collect_list(col).alias(PARTIAL_COLUMN.format(col=col, agg='collect_list'))]
+        raise ValueError("aggregation `{}` of `{}` can't be done in two stages".format(agg, col))
+
+    def __final_aggregation(self, col, agg):
+        if agg in SIMPLE_AGGREGATIONS:
+            return getattr(F, agg)(PARTIAL_COLUMN.format(col=col, agg=agg)).alias(col)
+        if agg == 'count':
+            return F.sum(PARTIAL_COLUMN.format(col=col, agg='count')).alias(col)
+        if agg in ['avg', 'mean']:
+            return (F.sum(PARTIAL_COLUMN.format(col=col, agg='sum')) /
+                    F.sum(PARTIAL_COLUMN.format(col=col, agg='count'))).alias(col)
+        if agg == 'collect_list':
+            return F.flatten(F.collect_list(PARTIAL_COLUMN.format(col=col, agg='collect_list'))).alias(col)
+        merged_set = F.array_distinct(F.flatten(F.collect_list(PARTIAL_COLUMN.format(col=col, agg='collect_set'))))
+        if agg == 'concat_ws':
+            return F.concat_ws(self.concat_ws_seperator, merged_set).alias(col)
+        return merged_set.alias(col)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+PANDAS_AGGREGATIONS = {'avg': 'mean', 'mean': 'mean', 'max': 'max', 'min': 'min', 'first': 'first', 'last': 'last',
+                       'count': 'count'}
+
+
+def combine_pandas_sources(df, group_by_cols, grade_cols, aggregations, log_value_for_ones, allow_ones, replace_ones,
+                           concat_ws_seperator):
+    # type: (pd.DataFrame,list,list,dict,float,bool,float,str) -> pd.DataFrame
+    """
+    The pandas version of MaximumLikelihood.process (on the union of the sources), with the same semantics as the
+    spark version: grades are combined as sum(log(1 - p)) per group, where p >= 1 or null counts as
+    log_value_for_ones, and converted back with 1 - exp.
+    The groups are factorized once, and summed grades use a weighted bincount on the group codes.
+    `first` and `last` are the exception: here they are the first and last non null value in the order of the
+    sources, while spark's first and last keep nulls and depend on the order of the rows after the shuffle, which
+    isn't deterministic, so the two versions can differ on them.
+    """
+    grouper = df.groupby(group_by_cols, sort=False, dropna=False)
+    codes = grouper.ngroup().to_numpy()
+    groups_count = grouper.ngroups
+    first_rows = np.unique(codes, return_index=True)[1]
+    result = df[group_by_cols].iloc[first_rows].reset_index(drop=True)
+
+    for col, agg in aggregations.items():
+        if col in grade_cols and agg == 'sum':
+            result[col] = np.bincount(codes, weights=get_log_of_grades(df[col], log_value_for_ones),
+                                      minlength=groups_count)
+        else:
+            values = get_log_of_grades(df[col], log_value_for_ones) if col in grade_cols else df[col]
+            result[col] = __aggregate(pd.Series(values, index=df.index), codes, agg, concat_ws_seperator).to_numpy()
+
+    for col in grade_cols:
+        result[col] = 1 - np.exp(result[col].to_numpy(dtype=float))
+        if not allow_ones:
+            result[col] = np.where(result[col] == 1, replace_ones, result[col])
+    return result
+
+
+def get_log_of_grades(grades, log_value_for_ones):
+    # type: (pd.Series,float) -> np.ndarray
+    """
+    log(1 - p), and log_value_for_ones where it isn't defined (like spark's log, that returns null)
+    """
+    values = grades.to_numpy(dtype=float, na_value=np.nan)
+    defined = values < 1
+    logs = np.full(values.shape, log_value_for_ones, dtype=float)
+    logs[defined] = np.log1p(-values[defined])
+    return logs
+
+
+def __aggregate(values, codes, agg, concat_ws_seperator):
+    # type: (pd.Series,np.ndarray,str,str) -> pd.Series
+    grouped = values.groupby(codes, sort=True)
+    if agg == 'sum':
+        return grouped.sum(min_count=1)
+    if agg in PANDAS_AGGREGATIONS:
+        return grouped.agg(PANDAS_AGGREGATIONS[agg])
+    if agg == 'collect_set':
+        return grouped.agg(lambda group: list(group.dropna().unique()))
+    if agg == 'collect_list':
+        return grouped.agg(lambda group: list(group.dropna()))
+    if agg == 'concat_ws':
+        return grouped.agg(lambda group: concat_ws_seperator.join(group.dropna().astype(str).unique()))
+    raise ValueError("aggregation `{}` isn't supported on pandas".format(agg))
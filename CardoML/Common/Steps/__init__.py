@@ -1,8 +1,10 @@
 from .APICReader import APICReader
 from .CalculatePrecision.calculate_precision import CalculatePrecision
+from .CalculatePrecision.calculate_multi_precision import CalculateMultiPrecision
 from .DefineStep import DefineStep
 from .PersistStep.persist_step import PersistStep
 from .Statisctics.intersection import Intersection
 from .Statisctics.id_counts import IdCounts
+from .Statisctics.logic_statistics import LogicStatistics
 from .StatisticModel import *
 from .UnionDataframes.union_dataframes import UnionDataframes
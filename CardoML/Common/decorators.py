@@ -1,9 +1,13 @@
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime
-from subprocess import Popen, PIPE
+from threading import Lock
+from typing import Callable, List
 
 import pandas as pd
 from CardoLibs.IO import HdfsWriter, HdfsReader
 
+from CardoML.Common.FileSystem import HadoopFileSystem
+
 
 def save_data(step):
     def inner(self, cardo_context, *args):
@@ -37,12 +41,116 @@ def save_data(step):
     return inner
 
 
-def lazy(compute, user, max_days_diff=0):
+class PendingSnapshots:
+    """
+    Write snapshots in background threads and keep track of the writes that haven't finished yet, and of the
+    persisted inputs they were written from.
+    """
+    def __init__(self, max_workers: int = 4):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='snapshot')
+        self.futures = []  # type: List[Future]
+        self.persisted = []
+        self.lock = Lock()
+
+    def submit(self, func: Callable, *args) -> Future:
+        future = self.executor.submit(func, *args)
+        with self.lock:
+            self.futures.append(future)
+        return future
+
+    def keep(self, dataframe) -> None:
+        """
+        Keep a persisted input until `wait` (the lazy output of its step may still read it after the step returns)
+        """
+        with self.lock:
+            self.persisted.append(dataframe)
+
+    def wait(self, timeout: float = None) -> None:
+        """
+        Block until all the pending snapshots are written, then unpersist the kept inputs, raise the first error of
+        a failed write.
+        """
+        with self.lock:
+            futures, self.futures = self.futures, []
+        done, not_done = wait(futures, timeout=timeout)
+        with self.lock:
+            self.futures.extend(not_done)
+            persisted = []
+            if not self.futures:  # no write reads them anymore
+                persisted, self.persisted = self.persisted, []
+        for dataframe in persisted:
+            dataframe.dataframe.unpersist()
+        for future in done:
+            future.result()
+        if not_done:
+            raise TimeoutError('{} snapshots are still being written'.format(len(not_done)))
+
+
+pending_snapshots = PendingSnapshots()
+
+
+def wait_for_snapshots(timeout: float = None) -> None:
+    """
+    Barrier for `checkpoint_data`, call it at the end of the run, when the outputs of the checkpointed steps are
+    written (and before stopping the spark session). It also unpersists their inputs.
+    """
+    pending_snapshots.wait(timeout)
+
+
+def checkpoint_data(step):
+    """
+    Like `save_data`, but the snapshots are written in the background while the step keeps running:
+    spark dataframes are persisted and materialized once, then written by a spark job submitted from a side thread
+    while the step reads the same cached data. They stay persisted until `wait_for_snapshots`, since the lazy output
+    of the step still reads them after it returns.
+    pandas dataframes are written by a thread pool on the driver.
+    The step gets the persisted dataframe instead of a re-read of the snapshot, so don't mutate a pandas input in
+    place before its snapshot is written. Use `wait_for_snapshots` to make sure everything is written.
+    """
+    def inner(self, cardo_context, *args):
+        project_name = cardo_context.spark.sparkContext.appName
+        run_id = cardo_context.run_id
+        step_name = self.__class__.__name__
+        saved_df = []
+        no_names_index = 0
+
+        for dataframe in args:
+            df_name = dataframe.table_name
+            if (df_name == '') or (' ' in df_name):
+                df_name = no_names_index
+                no_names_index += 1
+            if dataframe.payload_type in ['dataframe', 'rdd', 'pandas']:
+                path = '{}/{}/{}/{}'.format(project_name, step_name, df_name, run_id)
+                if dataframe.payload_type != 'pandas':
+                    dataframe = dataframe.persist()
+                    dataframe.table_name = df_name
+                    dataframe.dataframe.count()  # computed once, the write and the step both read the cache
+                    pending_snapshots.keep(dataframe)
+                pending_snapshots.submit(__write_snapshot, cardo_context, dataframe, df_name, path)
+            saved_df.append(dataframe)
+        return step(self, cardo_context, *saved_df)
+
+    return inner
+
+
+def __write_snapshot(cardo_context, dataframe, df_name, path):
+    HdfsWriter(path, 'overwrite', 'parquet').process(cardo_context, dataframe)
+    cardo_context.logger.info('save dataframe:{} to path:{}'.format(df_name, path))
+
+
+def lazy(compute, user, max_days_diff=0, file_system=None):
+    """
+    :param compute: write the step inputs as a new snapshot (if the last one is too old) before reading them
+    :param user: read and write the snapshots under /user/{user}/
+    :param max_days_diff: reuse the last snapshot if it is at most that many days old. 0 always writes a new one
+    :param file_system: IFileSystem to list the snapshots with, defaults to the spark context's hadoop filesystem
+    """
     def actual_decorator(step):
         def inner(self, cardo_context, *args):
             project_name = cardo_context.spark.sparkContext.appName
             run_id = cardo_context.run_id
             step_name = self.__class__.__name__
+            snapshots_file_system = file_system if file_system is not None else HadoopFileSystem(cardo_context)
             no_names_index = 0
             saved_df = []
             path = ''
@@ -50,45 +158,24 @@ def lazy(compute, user, max_days_diff=0):
                 if user is not None:
                     path = '/user/{}/'.format(user)
 
-                if dataframe.payload_type in ['dataframe', 'rdd']:
-                    df_name = dataframe.table_name
-                    if (df_name == '') or (' ' in df_name):
-                        df_name = no_names_index
-                        no_names_index += 1
-
-                    df_path = path + '{}/{}/{}'.format(project_name, step_name, df_name)
-                    last_date, last_folder = __get_hdfs_last_date(df_path)
-                    days_diff = (datetime.now() - datetime.strptime(last_date, '%Y-%m-%d %H:%M')).days
-
-                    if compute and ((days_diff > max_days_diff) or max_days_diff == 0):
-                        df_run_path = '{}/{}'.format(df_path, run_id)
-                        HdfsWriter(df_run_path, 'overwrite', 'parquet').process(cardo_context, dataframe)
-                    elif not compute:
-                        last_date, _ = __get_hdfs_last_date(df_path)
-
-                    _, last_folder = __get_hdfs_last_date(df_path)
-                    dataframe = HdfsReader(last_folder, 'parquet').process(cardo_context)
-                    dataframe.table_name = df_name
-                    saved_df.append(dataframe)
-
-                elif dataframe.payload_type == 'pandas':
+                if dataframe.payload_type in ['dataframe', 'rdd', 'pandas']:
                     df_name = dataframe.table_name
                     if (df_name == '') or (' ' in df_name):
                         df_name = no_names_index
                         no_names_index += 1
 
                     df_path = path + '{}/{}/{}'.format(project_name, step_name, df_name)
-                    last_date, last_folder = __get_hdfs_last_date(df_path)
-                    days_diff = (datetime.now() - datetime.strptime(last_date, '%Y-%m-%d %H:%M')).days
+                    last_date, last_folder = snapshots_file_system.last_modified(df_path)
+                    days_diff = (datetime.now() - last_date).days
 
                     if compute and ((days_diff > max_days_diff) or max_days_diff == 0):
-                        df_run_path = '{}/{}'.format(df_path, run_id)
-                        HdfsWriter(df_run_path, 'overwrite', 'parquet').process(cardo_context, dataframe)
-                    elif not compute:
-                        last_date, _ = __get_hdfs_last_date(df_path)
+                        last_folder = snapshots_file_system.absolute_path('{}/{}'.format(df_path, run_id))
+                        HdfsWriter(last_folder, 'overwrite', 'parquet').process(cardo_context, dataframe)
 
-                    _, last_folder = __get_hdfs_last_date(df_path)
-                    dataframe = pd.read_parquet('/mnt/hadoopnfs{}'.format(last_folder))
+                    if dataframe.payload_type == 'pandas':
+                        dataframe = pd.read_parquet('/mnt/hadoopnfs{}'.format(last_folder))
+                    else:
+                        dataframe = HdfsReader(last_folder, 'parquet').process(cardo_context)
                     dataframe.table_name = df_name
                     saved_df.append(dataframe)
                 else:
@@ -98,15 +185,3 @@ def lazy(compute, user, max_days_diff=0):
         return inner
 
     return actual_decorator
-
-
-def __get_hdfs_last_date(project_name):
-    out, _ = Popen('hdfs dfs -ls {}/ | sort -k6,7'.format(project_name), stdout=PIPE, shell=True).communicate()
-    files = out.split()
-    if len(files) >= 3:
-        last_folder = files[-1]
-        hour = files[-2]
-        day = files[-3]
-        last_date = '{} {}'.format(day, hour)
-        return last_date, last_folder
-    return '1970-01-01 00:00', ''
@@ -1 +1,4 @@
-from .workflows_executor import WorkflowsExecutor
\ No newline at end of file
+from .workflows_executor import WorkflowsExecutor
+from .merge_workflows import merge_workflows, WorkflowStep
+from .step_metrics import StepMetrics, StepMetricsRecorder, InstrumentedStep, instrument_workflow
+from .workflows_report import WorkflowsReport, StepCost
@@ -0,0 +1,67 @@
+from typing import Dict, Hashable, List, Tuple
+
+import networkx as nx
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from CardoExecutor.Common.CardoGraph import CardoGraph
+from CardoExecutor.Contract.CardoContextBase import CardoContextBase
+from CardoExecutor.Contract.IStep import IStep
+from CardoExecutor.Workflows.DagWorkflow import DagWorkflow
+
+MERGED_WORKFLOW_NAME = "MergedWorkflows"
+
+
+class WorkflowStep(IStep):
+    """
+    A per workflow copy of a step instance that is shared between workflows but gets different inputs in each of them
+    (ex: the IdCounts of a LogicMeasurer sub workflow). It runs the original step on its own inputs.
+    """
+    def __init__(self, step: IStep, workflow_name: str):
+        self.step = step
+        self.workflow_name = workflow_name
+
+    def process(self, cardo_context: CardoContextBase, *args, **kwargs) -> CardoDataFrame:
+        return self.step.process(cardo_context, *args, **kwargs)
+
+    def __getattr__(self, item: str):
+        if item == 'step':
+            raise AttributeError(item)
+        return getattr(self.step, item)
+
+    def __str__(self) -> str:
+        return str(self.step)
+
+
+def merge_workflows(workflows: List[DagWorkflow], name: str = MERGED_WORKFLOW_NAME) -> DagWorkflow:
+    """
+    Compose the workflows into one DagWorkflow where every shared prefix runs once.
+    Two nodes are merged when they are the same step instance and get the same (already merged) inputs, so a reader
+    that appears in every workflow runs once and fans out to all of its consumers.
+    A step instance that appears in several workflows with different inputs is kept as a node per workflow.
+    :param workflows: the workflows to merge
+    :param name: the name of the merged workflow
+    :return: one workflow that runs all the steps of all the workflows
+    """
+    dag = CardoGraph()
+    merged_nodes = {}  # type: Dict[Tuple[int, Tuple], IStep]
+    for workflow in workflows:
+        workflow_nodes = {}  # type: Dict[IStep, IStep]
+        for node in nx.topological_sort(workflow.dag):
+            inputs = [(workflow_nodes[predecessor], workflow.dag.get_edge_data(predecessor, node) or {})
+                      for predecessor in workflow.dag.predecessors(node)]
+            signature = (id(node), tuple(sorted((id(merged_input), __edge_signature(edge_data))
+                                                for merged_input, edge_data in inputs)))
+            if signature not in merged_nodes:
+                merged_node = node if node not in dag else WorkflowStep(node, workflow.name)
+                dag.add_node(merged_node, **workflow.dag.nodes[node])
+                for merged_input, edge_data in inputs:
+                    dag.add_edge(merged_input, merged_node, **edge_data)
+                merged_nodes[signature] = merged_node
+            workflow_nodes[node] = merged_nodes[signature]
+
+    merged_workflow = DagWorkflow(name)
+    merged_workflow.dag = dag
+    return merged_workflow
+
+
+def __edge_signature(edge_data: dict) -> Tuple[Tuple[Hashable, str], ...]:
+    return tuple(sorted((key, repr(value)) for key, value in edge_data.items()))
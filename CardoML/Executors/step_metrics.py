@@ -0,0 +1,147 @@
+import time
+import uuid
+from threading import Lock
+from typing import List, NamedTuple, Optional, Tuple
+
+import networkx as nx
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from CardoExecutor.Contract.CardoContextBase import CardoContextBase
+from CardoExecutor.Contract.IStep import IStep
+from CardoExecutor.Workflows.DagWorkflow import DagWorkflow
+
+JOB_GROUP_PROPERTY = "spark.jobGroup.id"
+STEP_METRICS_LOG_TYPE = "step_metrics"
+
+
+class StepMetrics(NamedTuple):
+    workflow: str
+    step: IStep
+    start: float
+    seconds: float
+    spark_jobs: int
+    spark_stages: int
+    shuffle_read_bytes: int
+    shuffle_write_bytes: int
+    rows: Optional[int]
+    size_bytes: Optional[int]
+
+
+class StepMetricsRecorder:
+    """
+    Keep the metrics of the instrumented steps, and log every one of them.
+    """
+    def __init__(self):
+        self.metrics = []  # type: List[StepMetrics]
+        self.lock = Lock()
+
+    def record(self, cardo_context: CardoContextBase, metrics: StepMetrics) -> None:
+        with self.lock:
+            self.metrics.append(metrics)
+        cardo_context.logger.info(f"step {metrics.step} of {metrics.workflow} took {metrics.seconds:.3f} seconds, "
+                                  f"{metrics.spark_jobs} spark jobs",
+                                  extra={"log_type": STEP_METRICS_LOG_TYPE,
+                                         "table_name": metrics.workflow,
+                                         "step": str(metrics.step),
+                                         "statistic_type": "step_seconds",
+                                         "statistic_value": metrics.seconds,
+                                         "spark_jobs": metrics.spark_jobs,
+                                         "spark_stages": metrics.spark_stages,
+                                         "shuffle_read_bytes": metrics.shuffle_read_bytes,
+                                         "shuffle_write_bytes": metrics.shuffle_write_bytes,
+                                         "rows": metrics.rows,
+                                         "size_bytes": metrics.size_bytes})
+
+    def clear(self) -> None:
+        with self.lock:
+            self.metrics = []
+
+
+class InstrumentedStep(IStep):
+    """
+    Run a step under its own spark job group and record its metrics.
+    Spark is lazy, so the jobs (and the time) of a step are the ones its process triggered, usually the actions of
+    the step itself and the transformations of the steps before it that weren't materialized yet.
+    """
+    def __init__(self, step: IStep, workflow_name: str, recorder: StepMetricsRecorder):
+        self.step = step
+        self.workflow_name = workflow_name
+        self.recorder = recorder
+
+    def process(self, cardo_context: CardoContextBase, *args, **kwargs) -> CardoDataFrame:
+        spark_context = getattr(getattr(cardo_context, 'spark', None), 'sparkContext', None)
+        if spark_context is None:
+            job_group = previous_job_group = None
+        else:
+            job_group = f"{self.workflow_name}:{self.step}:{uuid.uuid4()}"
+            previous_job_group = spark_context.getLocalProperty(JOB_GROUP_PROPERTY)
+            spark_context.setLocalProperty(JOB_GROUP_PROPERTY, job_group)
+        start = time.time()
+        try:
+            result = self.step.process(cardo_context, *args, **kwargs)
+        finally:
+            seconds = time.time() - start
+            if spark_context is not None:
+                spark_context.setLocalProperty(JOB_GROUP_PROPERTY, previous_job_group)
+        jobs, stages, shuffle_read_bytes, shuffle_write_bytes = self.__spark_metrics(spark_context, job_group)
+        rows, size_bytes = self.__output_size(result)
+        self.recorder.record(cardo_context, StepMetrics(self.workflow_name, self.step, start, seconds, jobs, stages,
+                                                        shuffle_read_bytes, shuffle_write_bytes, rows, size_bytes))
+        return result
+
+    def __getattr__(self, item: str):
+        if item == 'step':
+            raise AttributeError(item)
+        return getattr(self.step, item)
+
+    def __str__(self) -> str:
+        return str(self.step)
+
+    @staticmethod
+    def __spark_metrics(spark_context, job_group: str) -> Tuple[int, int, int, int]:
+        if spark_context is None:
+            return 0, 0, 0, 0
+        status_tracker = spark_context.statusTracker()
+        job_ids = status_tracker.getJobIdsForGroup(job_group)
+        stage_ids = {stage_id for job_id in job_ids for stage_id in getattr(status_tracker.getJobInfo(job_id),
+                                                                            'stageIds', [])}
+        shuffle_read_bytes = shuffle_write_bytes = 0
+        status_store = spark_context._jsc.sc().statusStore()
+        for stage_id in stage_ids:
+            try:
+                stage_data = status_store.lastStageAttempt(stage_id)
+            except Exception:  # skipped stages (their shuffle output was reused) have no attempt
+                continue
+            shuffle_read_bytes += stage_data.shuffleReadBytes()
+            shuffle_write_bytes += stage_data.shuffleWriteBytes()
+        return len(job_ids), len(stage_ids), shuffle_read_bytes, shuffle_write_bytes
+
+    @staticmethod
+    def __output_size(result) -> Tuple[Optional[int], Optional[int]]:
+        """
+        The rows and size of the result when they are known without running anything: the length of a pandas
+        dataframe, or the statistics of the optimized plan of a spark dataframe (exact for cached or counted data)
+        """
+        if not isinstance(result, CardoDataFrame):
+            return None, None
+        if result.payload_type == 'pandas':
+            return len(result.dataframe), int(result.dataframe.memory_usage(index=True, deep=True).sum())
+        if result.payload_type == 'dataframe':
+            try:
+                stats = result.dataframe._jdf.queryExecution().optimizedPlan().stats()
+            except Exception:
+                return None, None
+            rows = int(stats.rowCount().get().toString()) if stats.rowCount().isDefined() else None
+            return rows, int(stats.sizeInBytes().toString())
+        return None, None
+
+
+def instrument_workflow(workflow: DagWorkflow, recorder: StepMetricsRecorder) -> DagWorkflow:
+    """
+    A copy of the workflow where every step is an InstrumentedStep, with the same graph attributes.
+    the steps of a merged workflow that belong to one workflow (WorkflowStep) are recorded under its name.
+    """
+    instrumented_workflow = DagWorkflow(workflow.name)
+    instrumented_workflow.dag = nx.relabel_nodes(
+        workflow.dag, {step: InstrumentedStep(step, getattr(step, 'workflow_name', workflow.name), recorder)
+                       for step in workflow.dag.nodes}, copy=True)
+    return instrumented_workflow
@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from itertools import chain
 from typing import Iterator, List, Union
 
@@ -8,45 +9,146 @@ from CardoExecutor.Contract.CardoContextBase import CardoContextBase
 from CardoExecutor.Contract.IWorkflowExecutor import IWorkflowExecutor
 from CardoExecutor.Workflows.DagWorkflow import DagWorkflow
 
+from CardoML.Common.ISteps.ICacheStep import CacheManager
 from CardoML.Factory.Workflows.WorkflowsFactory import WorkflowsFactory
+from .merge_workflows import merge_workflows
+from .step_metrics import StepMetricsRecorder, instrument_workflow
+from .workflows_report import WorkflowsReport
+
+SCHEDULER_POOL_PROPERTY = "spark.scheduler.pool"
 
 
 class WorkflowsExecutor:
     """
     Execute multiple workflows
     """
-    def __init__(self, executor: IWorkflowExecutor, max_fails: int = 0, cannot_fail: List[str] = ()):
+    def __init__(self, executor: IWorkflowExecutor, max_fails: int = 0, cannot_fail: List[str] = (),
+                 max_workers: int = 1, use_scheduler_pools: bool = False, merge_shared_steps: bool = False,
+                 cache_manager: CacheManager = None, step_metrics: StepMetricsRecorder = None):
         """
         :param executor: the executor to run the workflows. ex: LinearWorkflowExecutor
         :param max_fails: max workflows that can fail without failing the run. put `-1` for unlimited failures.
         :param cannot_fail: if max_fails is used, you can specify a workflow that if it fails everything fails.
+        :param max_workers: number of workflows to run at the same time. `1` runs them one after another.
+        :param use_scheduler_pools: when running concurrently, submit every workflow's spark jobs into a
+            scheduler pool named after the workflow (needs `spark.scheduler.mode=FAIR` to have an effect).
+        :param merge_shared_steps: run all the workflows as one composed workflow, so steps that are shared between
+            workflows (ex: the ground truth reader of a LogicMeasurer) run once. the workflows can't fail separately
+            in this mode, so any failure fails the run.
+        :param cache_manager: release the results of the ICacheSteps once the workflows that consume them finished.
+            the ICacheSteps of the workflows report their results to it.
+            ex: `CardoML.Common.ISteps.ICacheStep.cache_manager` or a `CacheManager(max_bytes=...)` of this executor
+        :param step_metrics: record the time, spark jobs, stages and shuffle bytes of every step into this recorder
+            (and log them), and keep a `WorkflowsReport` of every run in `report`. without it the steps run as they
+            are.
         """
         self.executor = executor
         self.max_fails = max_fails
         self.cannot_fail = cannot_fail
+        self.max_workers = max_workers
+        self.use_scheduler_pools = use_scheduler_pools
+        self.merge_shared_steps = merge_shared_steps
+        self.cache_manager = cache_manager
+        self.step_metrics = step_metrics
+        self.report = None  # type: WorkflowsReport
 
     def execute_workflows(self, workflows: WorkflowsFactory, cardo_context: CardoContextBase, max_fails: int=None) \
             -> Iterator[Union[CardoDataFrame, None]]:
         max_fails = max_fails if max_fails else self.max_fails
-        results = []
-        fail_count = 0
         workflows_to_run = list(workflows.get_workflows_to_run())
         self.__log_workflows_plan(workflows_to_run, cardo_context)
-        for workflow in workflows_to_run:
+        first_metrics = len(self.step_metrics.metrics) if self.step_metrics is not None else 0
+        if self.cache_manager is not None:
+            self.cache_manager.register_workflows(workflows_to_run)
+        if self.merge_shared_steps:
+            try:
+                results = [list(self.executor.execute(self.__instrument(merge_workflows(workflows_to_run)),
+                                                      cardo_context))]
+            finally:
+                for workflow in workflows_to_run:
+                    self.__workflow_finished(workflow)
+        elif self.max_workers > 1:
+            results = self.__execute_concurrently(workflows_to_run, cardo_context, max_fails)
+        else:
+            results = self.__execute_serially(workflows_to_run, cardo_context, max_fails)
+        if self.step_metrics is not None:
+            self.report = WorkflowsReport(workflows_to_run, self.step_metrics.metrics[first_metrics:])
+            self.report.log(cardo_context)
+        return chain.from_iterable(results)
+
+    def __execute_serially(self, workflows: List[DagWorkflow], cardo_context: CardoContextBase,
+                           max_fails: int) -> List[List[Union[CardoDataFrame, None]]]:
+        results = []
+        fail_count = 0
+        for workflow in workflows:
             try:
-                results.append(list(self.executor.execute(workflow, cardo_context)))
+                results.append(self.__execute_workflow(workflow, cardo_context))
             except Exception as e:
                 fail_count += 1
-                cardo_context.logger.error(e)
-                if (fail_count >= max_fails) and (max_fails >= 0):
-                    raise Exception(f"Workflow errors exceeded max fails limit ({max_fails})")
-                elif workflow.name in self.cannot_fail:
-                    raise Exception(f"{e}")
-        return chain.from_iterable(results)
+                self.__handle_failure(workflow, e, fail_count, max_fails, cardo_context)
+        return results
+
+    def __execute_concurrently(self, workflows: List[DagWorkflow], cardo_context: CardoContextBase,
+                               max_fails: int) -> List[List[Union[CardoDataFrame, None]]]:
+        """
+        Results are returned in the order of `workflows`, no matter which workflow finished first.
+        Once the run is going to fail, workflows that haven't started yet are cancelled.
+        """
+        results = [[] for _ in workflows]
+        fail_count = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='workflow') as pool:
+            futures = {pool.submit(self.__execute_workflow, workflow, cardo_context): index
+                       for index, workflow in enumerate(workflows)}
+            try:
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        results[index] = future.result()
+                    except Exception as e:
+                        fail_count += 1
+                        self.__handle_failure(workflows[index], e, fail_count, max_fails, cardo_context)
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+        return results
+
+    def __execute_workflow(self, workflow: DagWorkflow, cardo_context: CardoContextBase) \
+            -> List[Union[CardoDataFrame, None]]:
+        try:
+            if not self.use_scheduler_pools:
+                return list(self.executor.execute(self.__instrument(workflow), cardo_context))
+            spark_context = cardo_context.spark.sparkContext
+            spark_context.setLocalProperty(SCHEDULER_POOL_PROPERTY, workflow.name)
+            try:
+                return list(self.executor.execute(self.__instrument(workflow), cardo_context))
+            finally:
+                spark_context.setLocalProperty(SCHEDULER_POOL_PROPERTY, None)
+        finally:
+            self.__workflow_finished(workflow)
+
+    def __instrument(self, workflow: DagWorkflow) -> DagWorkflow:
+        if self.step_metrics is None:
+            return workflow
+        return instrument_workflow(workflow, self.step_metrics)
+
+    def __workflow_finished(self, workflow: DagWorkflow) -> None:
+        if self.cache_manager is not None:
+            self.cache_manager.workflow_finished(workflow)
+
+    def __handle_failure(self, workflow: DagWorkflow, exception: Exception, fail_count: int, max_fails: int,
+                         cardo_context: CardoContextBase) -> None:
+        cardo_context.logger.error(exception)
+        if (fail_count >= max_fails) and (max_fails >= 0):
+            raise Exception(f"Workflow errors exceeded max fails limit ({max_fails})")
+        elif workflow.name in self.cannot_fail:
+            raise Exception(f"{exception}")
 
     @staticmethod
     def __log_workflows_plan(workflows: List[DagWorkflow], cardo_context: CardoContextBase) -> None:
         dg = CardoGraph()
         for workflow in workflows:
             dg = nx.compose(dg, workflow.dag)
-        cardo_context.logger.debug(f"Entire Workflows plan: {str(dg)}")
+        cardo_context.logger.debug(f"Entire Workflows plan: {len(workflows)} workflows "
+                                   f"({', '.join(workflow.name for workflow in workflows)}), "
+                                   f"{dg.number_of_nodes()} steps, {dg.number_of_edges()} dependencies")
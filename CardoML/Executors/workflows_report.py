@@ -0,0 +1,177 @@
+import json
+from typing import Any, Dict, List, Tuple
+
+import networkx as nx
+from CardoExecutor.Common.CardoGraph import CardoGraph
+from CardoExecutor.Contract.CardoContextBase import CardoContextBase
+from CardoExecutor.Contract.IStep import IStep
+from CardoExecutor.Workflows.DagWorkflow import DagWorkflow
+
+from .step_metrics import StepMetrics
+
+CRITICAL_PATH_ATTRIBUTES = {'color': 'red', 'penwidth': '3'}
+RECOMPUTED_ATTRIBUTES = {'peripheries': '2'}
+REPORT_LOG_TYPE = "workflows_report"
+
+
+class StepCost:
+    def __init__(self, step: IStep):
+        self.step = step
+        self.workflows = []  # type: List[str]
+        self.runs = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.spark_jobs = 0
+        self.shuffle_bytes = 0
+        self.rows = None
+        self.size_bytes = None
+
+    def add(self, metrics: StepMetrics) -> None:
+        self.runs += 1
+        self.seconds += metrics.seconds
+        self.max_seconds = max(self.max_seconds, metrics.seconds)
+        self.spark_jobs += metrics.spark_jobs
+        self.shuffle_bytes += metrics.shuffle_read_bytes + metrics.shuffle_write_bytes
+        self.rows = metrics.rows if metrics.rows is not None else self.rows
+        self.size_bytes = metrics.size_bytes if metrics.size_bytes is not None else self.size_bytes
+        if metrics.workflow not in self.workflows:
+            self.workflows.append(metrics.workflow)
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.seconds / self.runs if self.runs else 0.0
+
+    @property
+    def recomputed_seconds(self) -> float:
+        """
+        The time spent on running the step again after its first (slowest) run
+        """
+        return self.seconds - self.max_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'workflows': self.workflows, 'runs': self.runs, 'seconds': self.seconds,
+                'mean_seconds': self.mean_seconds, 'recomputed_seconds': self.recomputed_seconds,
+                'spark_jobs': self.spark_jobs, 'shuffle_bytes': self.shuffle_bytes, 'rows': self.rows,
+                'size_bytes': self.size_bytes}
+
+
+class WorkflowsReport:
+    """
+    The plan of all the workflows as one graph (a step instance shared between workflows is one node), annotated with
+    the measured cost of every step (see `StepMetricsRecorder`).
+    `critical_path` is the slowest chain of dependent steps, the run can't be shorter than it however many workflows
+    run in parallel. `recomputed` are the steps that ran more than once, where caching would pay off.
+    """
+    def __init__(self, workflows: List[DagWorkflow], metrics: List[StepMetrics]):
+        self.graph = CardoGraph()
+        for workflow in workflows:
+            self.graph = nx.compose(self.graph, workflow.dag)
+        self.costs = {step: StepCost(step) for step in self.graph.nodes}  # type: Dict[IStep, StepCost]
+        for step_metrics in metrics:
+            step = step_metrics.step
+            while step not in self.costs and hasattr(step, 'step'):  # a WorkflowStep of a merged workflow
+                step = step.step
+            if step in self.costs:
+                self.costs[step].add(step_metrics)
+        self.critical_path, self.critical_path_seconds = self.__critical_path()
+        self.recomputed = sorted([cost for cost in self.costs.values() if cost.runs > 1],
+                                 key=lambda cost: cost.recomputed_seconds, reverse=True)
+
+    def to_json(self) -> Dict[str, Any]:
+        ids = self.__node_ids()
+        critical_path = set(self.critical_path)
+        return {'nodes': [dict(id=ids[step], label=str(step), critical=step in critical_path,
+                               attributes=self.__node_attributes(step), **self.costs[step].to_dict())
+                          for step in self.graph.nodes],
+                'edges': [{'source': ids[source], 'target': ids[target]} for source, target in self.graph.edges],
+                'critical_path': [ids[step] for step in self.critical_path],
+                'critical_path_seconds': self.critical_path_seconds,
+                'recomputed': [ids[cost.step] for cost in self.recomputed]}
+
+    def to_graphviz(self, name: str = 'workflows') -> str:
+        """
+        :return: the annotated graph in the dot language, drawn with the `node_attributes` of the steps. the critical
+            path is red and recomputed steps have a double border.
+        """
+        ids = self.__node_ids()
+        critical_path = set(self.critical_path)
+        critical_edges = set(zip(self.critical_path, self.critical_path[1:]))
+        lines = ['digraph {} {{'.format(self.__quote(name))]
+        for step in self.graph.nodes:
+            attributes = self.__node_attributes(step)
+            if step in critical_path:
+                attributes.update(CRITICAL_PATH_ATTRIBUTES)
+            if self.costs[step].runs > 1:
+                attributes.update(RECOMPUTED_ATTRIBUTES)
+            attributes['label'] = self.__label(step)
+            lines.append('  {} [{}];'.format(ids[step], ', '.join('{}={}'.format(key, self.__quote(value))
+                                                                  for key, value in attributes.items())))
+        for source, target in self.graph.edges:
+            edge_attributes = CRITICAL_PATH_ATTRIBUTES if (source, target) in critical_edges else {}
+            lines.append('  {} -> {}{};'.format(ids[source], ids[target], ' [{}]'.format(', '.join(
+                '{}={}'.format(key, self.__quote(value)) for key, value in edge_attributes.items()))
+                if edge_attributes else ''))
+        lines.append('}')
+        return '\n'.join(lines)
+
+    def write(self, path: str) -> None:
+        """
+        Write `<path>.json` and `<path>.dot`
+        """
+        with open('{}.json'.format(path), 'w') as json_file:
+            json.dump(self.to_json(), json_file, indent=2)
+        with open('{}.dot'.format(path), 'w') as dot_file:
+            dot_file.write(self.to_graphviz())
+
+    def log(self, cardo_context: CardoContextBase, top: int = 5) -> None:
+        cardo_context.logger.info(f"critical path: {' -> '.join(str(step) for step in self.critical_path)}",
+                                  extra={"log_type": REPORT_LOG_TYPE,
+                                         "statistic_type": "critical_path_seconds",
+                                         "statistic_value": self.critical_path_seconds,
+                                         "steps": len(self.graph), "edges": self.graph.number_of_edges()})
+        for cost in self.recomputed[:top]:
+            cardo_context.logger.info(f"step {cost.step} ran {cost.runs} times in {cost.workflows}",
+                                      extra={"log_type": REPORT_LOG_TYPE,
+                                             "step": str(cost.step),
+                                             "statistic_type": "recomputed_seconds",
+                                             "statistic_value": cost.recomputed_seconds})
+
+    def __critical_path(self) -> Tuple[List[IStep], float]:
+        finish = {}  # type: Dict[IStep, Tuple[float, IStep]]
+        for step in nx.topological_sort(self.graph):
+            slowest_input = max(self.graph.predecessors(step), key=lambda predecessor: finish[predecessor][0],
+                                default=None)
+            start = finish[slowest_input][0] if slowest_input is not None else 0.0
+            finish[step] = (start + self.costs[step].mean_seconds, slowest_input)
+        if not finish:
+            return [], 0.0
+        step = max(finish, key=lambda node: finish[node][0])
+        total_seconds = finish[step][0]
+        path = []
+        while step is not None:
+            path.append(step)
+            step = finish[step][1]
+        return path[::-1], total_seconds
+
+    def __node_ids(self) -> Dict[IStep, str]:
+        return {step: 'step_{}'.format(index) for index, step in enumerate(self.graph.nodes)}
+
+    def __node_attributes(self, step: IStep) -> Dict[str, str]:
+        attributes = dict(getattr(step, 'node_attributes', None) or {})
+        attributes.update(self.graph.nodes[step])
+        return {key: str(value) for key, value in attributes.items()}
+
+    def __label(self, step: IStep) -> str:
+        cost = self.costs[step]
+        label = '{}\n{:.1f}s'.format(step, cost.mean_seconds)
+        if cost.runs > 1:
+            label += ' x{}'.format(cost.runs)
+        if cost.rows is not None:
+            label += '\n{:,} rows'.format(cost.rows)
+        if cost.size_bytes is not None:
+            label += '\n{:,} bytes'.format(cost.size_bytes)
+        return label
+
+    @staticmethod
+    def __quote(value: Any) -> str:
+        return '"{}"'.format(str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
@@ -1,20 +1,51 @@
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from CardoExecutor.Contract.CardoContextBase import CardoContextBase
 from CardoExecutor.Contract.IStep import IStep
 
-from CardoML.Common.Core import get_all_subclasses
+from CardoML.Common.Core import SingleFlight
 from CardoML.Common.ISteps.ICacheStep import ICacheStep
 from CardoML.Factory.MetaClasses import Singleton
 
+CREATIONS_ATTRIBUTE = "creations"
+
 
 class DataFramesFactory(metaclass=Singleton):
     """
-    Make steps that inherit ICacheStep to be accessible from everywhere (same instance)
+    Make steps that inherit ICacheStep to be accessible from everywhere (same instance).
+    A step is created the first time it is accessed, so steps the run doesn't use are never created.
     """
     def __init__(self):
-        for cached_step in set(get_all_subclasses(ICacheStep)):
-            self.__setattr__(cached_step.__name__, cached_step())
+        object.__setattr__(self, CREATIONS_ATTRIBUTE, SingleFlight())
 
     def __getattr__(self, key: str) -> ICacheStep:
-        return super().__getattribute__(key.lower())
+        name = key.lower()
+        if name in self.__dict__:
+            return self.__dict__[name]
+        cached_step = ICacheStep.registry.get(name)
+        if cached_step is None:
+            raise AttributeError(key)
+        return getattr(self, CREATIONS_ATTRIBUTE).do(name, self.__create, name, cached_step)
 
     def __setattr__(self, key: str, value: IStep) -> None:
         super().__setattr__(key.lower(), value)
+
+    def warm_up(self, cardo_context: CardoContextBase, *names: str, max_workers: int = None) -> List[CardoDataFrame]:
+        """
+        Create and compute cached steps in parallel, ex: at the start of the run
+        :param names: names of the cached steps, all the registered ones if no names are given
+        :param max_workers: number of steps to compute at the same time
+        :return: the results of the steps, in the order of names
+        """
+        names = names or [name for name, cached_step in ICacheStep.registry.items()
+                          if not inspect.isabstract(cached_step)]
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='warm_up') as pool:
+            return list(pool.map(lambda name: getattr(self, name).process(cardo_context), names))
+
+    def __create(self, name: str, cached_step: type) -> ICacheStep:
+        if name not in self.__dict__:
+            setattr(self, name, cached_step())
+        return self.__dict__[name]
@@ -1,3 +1,5 @@
+from threading import RLock
+
 INSTANCE = "__instance"
 
 
@@ -6,7 +8,11 @@ class Singleton(type):
     When used as a metaclass, force a class to have only 1 instance
     creating the class again will return the existing instance
     """
+    __lock = RLock()
+
     def __call__(cls, *args, **kwargs):
         if not hasattr(cls, INSTANCE):
-            setattr(cls, INSTANCE, super().__call__(*args, **kwargs))
+            with Singleton.__lock:
+                if not hasattr(cls, INSTANCE):
+                    setattr(cls, INSTANCE, super().__call__(*args, **kwargs))
         return getattr(cls, INSTANCE)
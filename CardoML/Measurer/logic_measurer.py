@@ -4,7 +4,8 @@ from CardoExecutor.Contract.IWorkflowFactory import IWorkflowFactory
 from CardoExecutor.Workflows.DagSubWorkflow import DagSubWorkflow
 from CardoExecutor.Contract.IStep import IStep
 
-from CardoML.Common.Steps import IdCounts, Intersection, CalculatePrecision
+from CardoML.Common.StepCache.result_storage import IResultStorage
+from CardoML.Common.Steps import CalculateMultiPrecision, DefineStep, LogicStatistics
 
 
 class LogicMeasurer(IWorkflowFactory):
@@ -23,6 +24,15 @@ class LogicMeasurer(IWorkflowFactory):
 	precision_column : str, default None
 		if given keep the precision calculated as a column under the name given.
 
+	approximate_counts : bool, default False
+		use HyperLogLog for the distinct id counts.
+
+	relative_error : float, default 0.05
+		maximum relative standard deviation allowed for the approximate distinct counts.
+
+	state_storage : IResultStorage, default None
+		calculate the precision incrementally, keeping its per key counts in this storage (see `CalculatePrecision`).
+
 	Example
 	-------
 	gt = OracleReader(gt_query,conn)
@@ -31,29 +41,30 @@ class LogicMeasurer(IWorkflowFactory):
 
 	"""
 	def __init__(self, ids: List, intersection_datasets: List[IStep] = None, calc_precision: bool = True,
-				 precision_column: str = None) -> None:
+				 precision_column: str = None, approximate_counts: bool = False, relative_error: float = 0.05,
+				 state_storage: IResultStorage = None) -> None:
 		self.ids = ids
 		self.intersection_datasets = intersection_datasets
 		self.calc_precision = calc_precision
 		self.precision_column = precision_column
+		self.approximate_counts = approximate_counts
+		self.relative_error = relative_error
+		self.state_storage = state_storage
 
 	def create_workflow(self) -> DagSubWorkflow:
 		workflow = DagSubWorkflow(name='LogicMeasurer')
-		for id in self.ids:
-			counts = IdCounts(id)
-			workflow.add_last(counts)
-		for intersection_dataset in self.intersection_datasets:
-			intersection = Intersection(self.ids, 'gt_intersections')
-			intersection_dataset = intersection_dataset()
-			workflow.add_after([intersection], [counts, intersection_dataset])
-			if self.calc_precision:
-				workflow.add_after([CalculatePrecision(self.ids[0], self.ids[1], precision_column=self.precision_column,
-										log_type='logics_precision')],[intersection, intersection_dataset])
-				workflow.add_after([CalculatePrecision(self.ids[0], self.ids[1], precision_column=self.precision_column,
-									   friendly_precision=True, log_type='logics_friendly_precision')],[intersection, intersection_dataset])
-				workflow.add_after([CalculatePrecision(self.ids[1], self.ids[0], precision_column=self.precision_column,
-									   log_type='logics_precision')],[intersection, intersection_dataset])
-				workflow.add_after([CalculatePrecision(self.ids[1], self.ids[0], precision_column=self.precision_column,
-									   friendly_precision=True, log_type='logics_friendly_precision')],[intersection, intersection_dataset])
+		logic = DefineStep(lambda cardo_dataframe: cardo_dataframe, name='logic')
+		workflow.add_last(logic)
+		intersection_datasets = [intersection_dataset() for intersection_dataset in self.intersection_datasets or []]
+		statistics = LogicStatistics(self.ids, 'gt_intersections', approximate=self.approximate_counts,
+									 relative_error=self.relative_error)
+		workflow.add_after([statistics], [logic, *intersection_datasets])
+		if self.calc_precision:
+			for intersection_dataset in intersection_datasets:
+				precision = CalculateMultiPrecision([(self.ids[0], self.ids[1]), (self.ids[1], self.ids[0])],
+												 precision_column=self.precision_column, log_type='logics_precision',
+												 friendly_log_type='logics_friendly_precision',
+												 state_storage=self.state_storage)
+				workflow.add_after([precision], [statistics, intersection_dataset])
 
 		return workflow
@@ -0,0 +1,234 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple
+
+import networkx as nx
+import pyspark.sql.functions as F
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from CardoExecutor.Contract.CardoContextBase import CardoContextBase
+from CardoExecutor.Contract.IStep import IStep
+from CardoExecutor.Workflows.DagWorkflow import DagWorkflow
+
+from CardoML.Common.Core import generic_fillna, spark_generic_fillna, union_dataframes
+from CardoML.Common.ISteps.ICacheStep import ICacheStep, cache_manager
+from CardoML.Common.Steps import CalculateMultiPrecision, CalculatePrecision, DefineStep, IdCounts, Intersection, \
+    MaximumLikelihood
+from CardoML.Executors import WorkflowsExecutor
+from CardoML.Factory.Workflows.WorkflowsFactory import WorkflowsFactory
+
+from context import BenchmarkContext
+from data import synthetic_pandas, synthetic_sources, to_pandas, to_spark
+
+SPARK = 'spark'
+PANDAS = 'pandas'
+WORKFLOWS = 16
+CACHE_HITS = 10
+
+Run = Callable[[], Any]
+
+
+class Case(NamedTuple):
+    name: str
+    backend: str
+    setup: Callable[[BenchmarkContext, int], Run]  # builds the inputs (not measured) and returns the measured run
+
+
+CASES = OrderedDict()  # type: Dict[str, Case]
+
+
+def case(name: str, backend: str) -> Callable:
+    def wrapper(setup: Callable[[BenchmarkContext, int], Run]):
+        CASES['{}/{}'.format(name, backend)] = Case(name, backend, setup)
+        return setup
+    return wrapper
+
+
+def materialize(cardo_dataframe: CardoDataFrame) -> CardoDataFrame:
+    """
+    Run the whole plan of a lazy spark result without collecting it
+    """
+    if cardo_dataframe.payload_type in ['dataframe', 'rdd']:
+        cardo_dataframe.dataframe.write.format('noop').mode('overwrite').save()
+    return cardo_dataframe
+
+
+def maximum_likelihood(**kwargs) -> MaximumLikelihood:
+    return MaximumLikelihood(['id'], ['grade'], {'grade': 'sum', 'source': 'concat_ws', 'amount': 'max'}, **kwargs)
+
+
+@case('union_dataframes', SPARK)
+def union_spark(cardo_context: BenchmarkContext, rows: int) -> Run:
+    sources = [to_spark(cardo_context, df) for df in synthetic_sources(rows)]
+    return lambda: materialize(union_dataframes(sources))
+
+
+@case('union_dataframes', PANDAS)
+def union_pandas(cardo_context: BenchmarkContext, rows: int) -> Run:
+    sources = [to_pandas(df) for df in synthetic_sources(rows)]
+    return lambda: union_dataframes(sources)
+
+
+@case('generic_fillna', SPARK)
+def fillna_spark(cardo_context: BenchmarkContext, rows: int) -> Run:
+    df = to_spark(cardo_context, synthetic_pandas(rows)).dataframe
+    return lambda: materialize(CardoDataFrame(spark_generic_fillna(df)))
+
+
+@case('generic_fillna', PANDAS)
+def fillna_pandas(cardo_context: BenchmarkContext, rows: int) -> Run:
+    df = synthetic_pandas(rows)
+    return lambda: generic_fillna(df)
+
+
+@case('maximum_likelihood', SPARK)
+def maximum_likelihood_spark(cardo_context: BenchmarkContext, rows: int) -> Run:
+    sources = [to_spark(cardo_context, df) for df in synthetic_sources(rows)]
+    return lambda: materialize(maximum_likelihood().process(cardo_context, *sources))
+
+
+@case('maximum_likelihood_salted', SPARK)
+def maximum_likelihood_salted_spark(cardo_context: BenchmarkContext, rows: int) -> Run:
+    sources = [to_spark(cardo_context, df) for df in synthetic_sources(rows)]
+    return lambda: materialize(maximum_likelihood(salt_buckets=8).process(cardo_context, *sources))
+
+
+@case('maximum_likelihood', PANDAS)
+def maximum_likelihood_pandas(cardo_context: BenchmarkContext, rows: int) -> Run:
+    sources = [to_pandas(df) for df in synthetic_sources(rows)]
+    return lambda: maximum_likelihood().process(cardo_context, *sources)
+
+
+@case('calculate_precision_strict', SPARK)
+def calculate_precision_strict(cardo_context: BenchmarkContext, rows: int) -> Run:
+    return __calculate_precision(cardo_context, rows, friendly_precision=False)
+
+
+@case('calculate_precision_friendly', SPARK)
+def calculate_precision_friendly(cardo_context: BenchmarkContext, rows: int) -> Run:
+    return __calculate_precision(cardo_context, rows, friendly_precision=True)
+
+
+@case('calculate_multi_precision', SPARK)
+def calculate_multi_precision(cardo_context: BenchmarkContext, rows: int) -> Run:
+    logic = to_spark(cardo_context, synthetic_pandas(rows), 'logic')
+    ground_truth = to_spark(cardo_context, synthetic_pandas(rows, seed=1), 'ground_truth')
+    step = CalculateMultiPrecision([('id', 'match')])
+    return lambda: step.process(cardo_context, logic, ground_truth)
+
+
+@case('id_counts', SPARK)
+def id_counts(cardo_context: BenchmarkContext, rows: int) -> Run:
+    logic = to_spark(cardo_context, synthetic_pandas(rows), 'logic')
+    step = IdCounts('id')
+    return lambda: step.process(cardo_context, logic)
+
+
+@case('intersection', SPARK)
+def intersection(cardo_context: BenchmarkContext, rows: int) -> Run:
+    logic = to_spark(cardo_context, synthetic_pandas(rows), 'logic')
+    ground_truth = to_spark(cardo_context, synthetic_pandas(rows, seed=1), 'ground_truth')
+    step = Intersection(['id'], 'gt_intersections')
+    return lambda: step.process(cardo_context, logic, ground_truth)
+
+
+@case('cache_register', SPARK)
+def cache_register_spark(cardo_context: BenchmarkContext, rows: int) -> Run:
+    return __cache_register(to_spark(cardo_context, synthetic_pandas(rows)), cardo_context)
+
+
+@case('cache_register', PANDAS)
+def cache_register_pandas(cardo_context: BenchmarkContext, rows: int) -> Run:
+    return __cache_register(to_pandas(synthetic_pandas(rows)), cardo_context)
+
+
+@case('workflows_executor_serial', SPARK)
+def workflows_executor_serial(cardo_context: BenchmarkContext, rows: int) -> Run:
+    return __workflows_executor(cardo_context, rows)
+
+
+@case('workflows_executor_concurrent', SPARK)
+def workflows_executor_concurrent(cardo_context: BenchmarkContext, rows: int) -> Run:
+    return __workflows_executor(cardo_context, rows, max_workers=4)
+
+
+@case('workflows_executor_merged', SPARK)
+def workflows_executor_merged(cardo_context: BenchmarkContext, rows: int) -> Run:
+    return __workflows_executor(cardo_context, rows, merge_shared_steps=True)
+
+
+class SyntheticReader(IStep):
+    def __init__(self, cardo_dataframe: CardoDataFrame):
+        self.cardo_dataframe = cardo_dataframe
+
+    def process(self, cardo_context: CardoContextBase, *cardo_dataframes: CardoDataFrame) -> CardoDataFrame:
+        return CardoDataFrame(self.cardo_dataframe.dataframe, self.cardo_dataframe.table_name)
+
+
+class BenchmarkCacheStep(ICacheStep):
+    pass
+
+
+class TopologicalWorkflowExecutor:
+    """
+    Run the steps of a workflow one after another in topological order, so the measurements of the
+    WorkflowsExecutor cases are its own scheduling and not the executor's.
+    """
+    def execute(self, workflow: DagWorkflow, cardo_context: CardoContextBase) -> List[CardoDataFrame]:
+        results = {}
+        for step in nx.topological_sort(workflow.dag):
+            results[step] = step.process(cardo_context, *[results[predecessor]
+                                                          for predecessor in workflow.dag.predecessors(step)])
+        return [materialize(results[step]) for step in workflow.dag if workflow.dag.out_degree(step) == 0]
+
+
+class SyntheticWorkflows(WorkflowsFactory):
+    """
+    Workflows that share one cached reader, each filters its part of the ids and counts them
+    """
+    def __init__(self, reader: IStep, workflows: int = WORKFLOWS):
+        super().__init__()
+        self.reader = reader
+        self.workflows = workflows
+
+    def get_all_workflows(self) -> List[DagWorkflow]:
+        return [self.create_workflows(index) for index in range(self.workflows)]
+
+    def create_workflows(self, index: int) -> DagWorkflow:
+        workflow = DagWorkflow('synthetic_{}'.format(index))
+        part = DefineStep(lambda cardo_dataframe: CardoDataFrame(
+            cardo_dataframe.dataframe.filter(F.col('id') % self.workflows == index), 'part_{}'.format(index)),
+            name='part_{}'.format(index))
+        workflow.add_last(self.reader)
+        workflow.add_after([part], [self.reader])
+        workflow.add_after([IdCounts('id')], [part])
+        return workflow
+
+
+def __calculate_precision(cardo_context: BenchmarkContext, rows: int, friendly_precision: bool) -> Run:
+    logic = to_spark(cardo_context, synthetic_pandas(rows), 'logic')
+    ground_truth = to_spark(cardo_context, synthetic_pandas(rows, seed=1), 'ground_truth')
+    step = CalculatePrecision('id', 'match', friendly_precision=friendly_precision)
+    return lambda: step.process(cardo_context, logic, ground_truth)
+
+
+def __cache_register(cardo_dataframe: CardoDataFrame, cardo_context: BenchmarkContext) -> Run:
+    """
+    One computation and CACHE_HITS hits of a fresh cached step
+    """
+    def run():
+        step = BenchmarkCacheStep(reader=SyntheticReader(cardo_dataframe))
+        for _ in range(CACHE_HITS + 1):
+            materialize(step.process(cardo_context))
+        cache_manager.release_all()
+    return run
+
+
+def __workflows_executor(cardo_context: BenchmarkContext, rows: int, **kwargs) -> Run:
+    cardo_dataframe = to_spark(cardo_context, synthetic_pandas(rows))
+
+    def run():
+        reader = BenchmarkCacheStep(reader=SyntheticReader(cardo_dataframe))
+        executor = WorkflowsExecutor(TopologicalWorkflowExecutor(), cache_manager=cache_manager, **kwargs)
+        results = list(executor.execute_workflows(SyntheticWorkflows(reader), cardo_context))
+        cache_manager.release_all()
+        return results
+    return run
@@ -0,0 +1,62 @@
+import logging
+import uuid
+from typing import Iterable, Set
+
+from CardoExecutor.Contract.CardoContextBase import CardoContextBase
+from pyspark.sql import SparkSession
+
+BENCHMARK_APP_NAME = 'CardoMLBenchmarks'
+RETAINED_JOBS = 100000
+
+
+class BenchmarkContext(CardoContextBase):
+    """
+    A cardo context over a local spark session (`local[*]`), with a logger that drops the records of the steps so
+    logging doesn't get into the measurements. without a master there is no spark session, for the pandas cases.
+    """
+    def __init__(self, master: str = 'local[*]', shuffle_partitions: int = 8):
+        super(BenchmarkContext, self).__init__()
+        self.logger = logging.getLogger(BENCHMARK_APP_NAME)
+        self.logger.addHandler(logging.NullHandler())
+        self.logger.propagate = False
+        self.run_id = str(uuid.uuid1()).lower()
+        self.spark = None
+        if master is None:
+            return
+        self.spark = SparkSession.builder \
+            .master(master) \
+            .appName(BENCHMARK_APP_NAME) \
+            .config('spark.sql.shuffle.partitions', shuffle_partitions) \
+            .config('spark.ui.showConsoleProgress', 'false') \
+            .config('spark.ui.retainedJobs', RETAINED_JOBS) \
+            .getOrCreate()
+        self.spark.sparkContext.setLogLevel('ERROR')
+
+    def job_ids(self) -> Set[int]:
+        """
+        The ids of the spark jobs that ran so far (no job group is set, so jobs that ran in other threads are counted)
+        """
+        if self.spark is None:
+            return set()
+        return set(self.spark.sparkContext.statusTracker().getJobIdsForGroup())
+
+    def stages_count(self, job_ids: Iterable[int]) -> int:
+        if self.spark is None:
+            return 0
+        status_tracker = self.spark.sparkContext.statusTracker()
+        stages = set()
+        for job_id in job_ids:
+            job_info = status_tracker.getJobInfo(job_id)
+            if job_info is not None:
+                stages.update(job_info.stageIds)
+        return len(stages)
+
+    def jvm_heap_used_bytes(self) -> int:
+        if self.spark is None:
+            return 0
+        runtime = self.spark.sparkContext._jvm.java.lang.Runtime.getRuntime()
+        return runtime.totalMemory() - runtime.freeMemory()
+
+    def stop(self) -> None:
+        if self.spark is not None:
+            self.spark.stop()
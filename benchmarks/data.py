@@ -0,0 +1,49 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+
+SCALES = {'small': 10 ** 4, 'medium': 10 ** 5, 'large': 10 ** 6}  # type: Dict[str, int]
+SEED = 17
+SOURCES = 8
+
+
+def synthetic_pandas(rows: int, seed: int = SEED, null_ratio: float = 0.1) -> pd.DataFrame:
+    """
+    A frame shaped like the outputs of our logics: an id with duplicates, a match value, a grade and a few string
+    and numeric features with nulls and "null like" strings.
+    """
+    random = np.random.RandomState(seed)
+    ids = random.randint(0, max(rows // 2, 1), rows)
+    df = pd.DataFrame({'id': ids,
+                       'match': (ids + (random.rand(rows) < 0.2) * random.randint(1, 5, rows)).astype('int64'),
+                       'grade': random.rand(rows) * 0.99,
+                       'source': random.choice(['a', 'b', 'c', 'd'], rows),
+                       'category': random.choice(['x', 'y', 'z', 'null', 'nan', '0', ''], rows),
+                       'amount': random.rand(rows) * 1000})
+    nulls = random.rand(rows) < null_ratio
+    df.loc[nulls, 'category'] = None
+    df.loc[random.rand(rows) < null_ratio, 'amount'] = np.nan
+    return df
+
+
+def synthetic_sources(rows: int, sources: int = SOURCES, seed: int = SEED) -> List[pd.DataFrame]:
+    """
+    The rows split into sources with overlapping ids, like the inputs of a MaximumLikelihood or a union.
+    """
+    return [synthetic_pandas(max(rows // sources, 1), seed=seed + index) for index in range(sources)]
+
+
+def to_spark(cardo_context, df: pd.DataFrame, table_name: str = '') -> CardoDataFrame:
+    """
+    Convert a synthetic frame to a cached and materialized spark dataframe, so building the input doesn't get into
+    the measurements.
+    """
+    spark_df = cardo_context.spark.createDataFrame(df).cache()
+    spark_df.count()
+    return CardoDataFrame(spark_df, table_name)
+
+
+def to_pandas(df: pd.DataFrame, table_name: str = '') -> CardoDataFrame:
+    return CardoDataFrame(df.copy(), table_name)
@@ -0,0 +1,145 @@
+"""
+Run the CardoML benchmarks on synthetic data, and compare them with a stored baseline.
+
+    python benchmarks/run_benchmarks.py --scales small medium
+    python benchmarks/run_benchmarks.py --backends pandas --cases maximum_likelihood union_dataframes
+    python benchmarks/run_benchmarks.py --save-baseline
+
+Every case is measured on every scale: the best and median wall time of `--repeat` runs (after a warm up run),
+the number of spark jobs and stages of a run, and the peak python memory (tracemalloc) and jvm heap of the driver.
+A result is a regression when its best time is slower than the baseline by more than `--tolerance`, or when it
+runs more spark jobs or stages than the baseline. the exit code is 1 when there are regressions.
+"""
+import argparse
+import fnmatch
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from cases import CASES, PANDAS, SPARK, Case
+from context import BenchmarkContext
+from data import SCALES
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'local.json')
+TIME_FIELDS = ['best_seconds']
+COUNT_FIELDS = ['spark_jobs', 'spark_stages']
+
+
+def measure(cardo_context: BenchmarkContext, benchmark: Case, rows: int, repeat: int) -> Dict[str, Any]:
+    run = benchmark.setup(cardo_context, rows)
+    run()  # warm up (code generation, broadcasts of the first run)
+
+    seconds = []
+    jobs = []
+    for _ in range(repeat):
+        gc.collect()
+        job_ids = cardo_context.job_ids()
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+        jobs = cardo_context.job_ids() - job_ids
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, python_peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'rows': rows,
+            'best_seconds': min(seconds),
+            'median_seconds': statistics.median(seconds),
+            'spark_jobs': len(jobs),
+            'spark_stages': cardo_context.stages_count(jobs),
+            'python_peak_bytes': python_peak_bytes,
+            'jvm_heap_used_bytes': cardo_context.jvm_heap_used_bytes()}
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """
+    :return: a line for every regression
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for field in TIME_FIELDS:
+            if result[field] > baseline[name][field] * (1 + tolerance):
+                regressions.append('{}: {} {:.3f} -> {:.3f}'.format(name, field, baseline[name][field], result[field]))
+        for field in COUNT_FIELDS:
+            if result[field] > baseline[name][field]:
+                regressions.append('{}: {} {} -> {}'.format(name, field, baseline[name][field], result[field]))
+    return regressions
+
+
+def environment() -> Dict[str, Any]:
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'created': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', nargs='+', default=['small', 'medium'], choices=list(SCALES))
+    parser.add_argument('--cases', nargs='+', default=['*'], help='case name patterns, ex: maximum_likelihood*')
+    parser.add_argument('--backends', nargs='+', default=[SPARK, PANDAS], choices=[SPARK, PANDAS])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--master', default='local[*]')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown, 0.2 is 20%%')
+    parser.add_argument('--output', help='write the results to this json file')
+    args = parser.parse_args(argv)
+
+    benchmarks = [benchmark for benchmark in CASES.values() if benchmark.backend in args.backends and
+                  any(fnmatch.fnmatch(benchmark.name, pattern) for pattern in args.cases)]
+    cardo_context = BenchmarkContext(args.master if SPARK in args.backends else None)
+    results = {}
+    try:
+        for scale in args.scales:
+            for benchmark in benchmarks:
+                name = '{}/{}@{}'.format(benchmark.name, benchmark.backend, scale)
+                results[name] = measure(cardo_context, benchmark, SCALES[scale], args.repeat)
+                print('{:<55} {best_seconds:>9.3f}s {spark_jobs:>5} jobs {spark_stages:>5} stages '
+                      '{python_peak_bytes:>13,} B'.format(name, **results[name]))
+    finally:
+        cardo_context.stop()
+
+    report = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        baseline = {'results': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+        baseline['environment'] = report['environment']
+        baseline['results'].update(results)
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        print('baseline saved to {}'.format(args.baseline))
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('no baseline at {}, run with --save-baseline to create one'.format(args.baseline))
+        return 0
+    with open(args.baseline) as baseline_file:
+        regressions = compare(results, json.load(baseline_file)['results'], args.tolerance)
+    for regression in regressions:
+        print('REGRESSION {}'.format(regression))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -17,6 +17,7 @@ setup(
         'matplotlib',
         'seaborn',
         'pandas',
-        'numpy'
+        'numpy',
+        'pyarrow'
     ],
 )
@@ -0,0 +1,38 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('pyspark')
+pytest.importorskip('CardoExecutor')
+
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+
+from CardoML.Common.Core.core import union_dataframes
+
+
+def test_nullable_int_and_float():
+    result = union_dataframes(CardoDataFrame(pd.DataFrame({'x': pd.array([1, None], dtype='Int64')})),
+                              CardoDataFrame(pd.DataFrame({'x': [1.5, 2.0]}))).dataframe
+    assert result['x'].dtype == pd.Float64Dtype()
+    assert result['x'].isna().tolist() == [False, True, False, False]
+    assert result['x'].dropna().tolist() == [1.0, 1.5, 2.0]
+
+
+def test_nullable_int_and_int():
+    result = union_dataframes(CardoDataFrame(pd.DataFrame({'x': pd.array([1, None], dtype='Int64')})),
+                              CardoDataFrame(pd.DataFrame({'x': [3, 4]}))).dataframe
+    assert result['x'].dtype == pd.Int64Dtype()
+    assert result['x'].dropna().tolist() == [1, 3, 4]
+
+
+def test_numbers_are_upcast():
+    result = union_dataframes(CardoDataFrame(pd.DataFrame({'x': pd.Series([1, 2], dtype='int32')})),
+                              CardoDataFrame(pd.DataFrame({'x': pd.Series([0.5], dtype='float32')}))).dataframe
+    assert result['x'].dtype == 'float64'
+    assert result['x'].tolist() == [1.0, 2.0, 0.5]
+
+
+def test_categories_are_unioned():
+    result = union_dataframes(CardoDataFrame(pd.DataFrame({'x': pd.Categorical(['a', 'b'])})),
+                              CardoDataFrame(pd.DataFrame({'x': pd.Categorical(['c'])}))).dataframe
+    assert isinstance(result['x'].dtype, pd.CategoricalDtype)
+    assert result['x'].tolist() == ['a', 'b', 'c']
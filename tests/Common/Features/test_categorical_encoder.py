@@ -0,0 +1,31 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+pytest.importorskip('pyarrow')
+pytest.importorskip('pyspark')
+pytest.importorskip('CardoExecutor')
+
+from CardoML.Common.Features import CategoricalEncoder
+
+
+@pytest.mark.parametrize('categories_count, dtype', [(127, np.int8), (128, np.int16), (32767, np.int16),
+                                                      (32768, np.int32)])
+def test_codes_fit_the_smallest_int(categories_count, dtype):
+    df = pd.DataFrame({'value': [str(index) for index in range(categories_count)]})
+    codes = CategoricalEncoder().fit(df).transform_codes(df)['value']
+    assert codes.dtype == dtype
+    assert codes.max() == categories_count
+
+
+def test_save_and_load_keep_the_category_types(tmp_path):
+    df = pd.DataFrame({'name': ['b', 'a', 'b'], 'flag': [True, False, False], 'size': [3, 1, 2]})
+    encoder = CategoricalEncoder(columns=['name', 'flag', 'size']).fit(df)
+    path = str(tmp_path / 'encoder.parquet')
+    encoder.save(path)
+    loaded = CategoricalEncoder.load(path)
+    for col_name, categories in encoder.categories.items():
+        assert loaded.categories[col_name].equals(categories)
+        assert loaded.categories[col_name].dtype == categories.dtype
+    assert loaded.transform_codes(df).equals(encoder.transform_codes(df))
+    assert loaded.transform_codes(df)['flag'].tolist() == [2, 1, 1]
@@ -0,0 +1,53 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+pytest.importorskip('matplotlib')
+pytest.importorskip('seaborn')
+pytest.importorskip('pyspark')
+pytest.importorskip('CardoExecutor')
+
+import matplotlib.pyplot as plt
+
+from CardoML.Common.Features.summaries import BOX_QUANTILES, SUMMARY_QUANTILES, box_stats, quantile_summaries
+from CardoML.Common.Features.visualization import collect_figures, compare_labeled_data, find_outliers
+
+
+@pytest.fixture
+def labeled():
+    random = np.random.default_rng(0)
+    return pd.DataFrame({'amount': random.normal(size=200), 'events': random.poisson(3, size=200).astype(float),
+                         'is_match': np.repeat([0, 1], 100)})
+
+
+@pytest.fixture(autouse=True)
+def agg_backend():
+    plt.switch_backend('Agg')
+    yield
+    plt.close('all')
+
+
+def test_summary_quantiles_include_box_quantiles():
+    assert set(BOX_QUANTILES) <= set(SUMMARY_QUANTILES)
+
+
+def test_box_stats_from_default_summaries(labeled):
+    stats = box_stats(quantile_summaries(labeled, ['amount'], 'is_match').loc[('amount', 0)])
+    assert stats['whislo'] <= stats['q1'] <= stats['med'] <= stats['q3'] <= stats['whishi']
+
+
+@pytest.mark.parametrize('plot_type', ['violin', 'box'])
+def test_compare_labeled_data(labeled, plot_type):
+    with collect_figures() as figures:
+        compare_labeled_data(labeled, 'is_match', plot_type=plot_type)
+    assert len(figures) == 1
+    legend = figures[0].axes[0].get_legend()
+    assert [text.get_text() for text in legend.get_texts()] == ['0 (n = 100)', '1 (n = 100)']
+
+
+def test_find_outliers_box_counts(labeled):
+    with collect_figures() as figures:
+        find_outliers(labeled, 'amount', 'is_match')
+    ax = figures[0].axes[0]
+    assert ax.get_title().startswith('amount by is_match (n = 200')
+    assert [text.get_text() for text in ax.get_yticklabels()] == ['0 (n = 100)', '1 (n = 100)']
@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('pyspark')
+pytest.importorskip('CardoExecutor')
+
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+
+from CardoML.Common.StepCache.result_storage import LocalResultStorage
+from CardoML.Common.Steps import CalculateMultiPrecision, CalculatePrecision
+
+COLUMNS = ['id', 'value', 'other_id', 'other_value']
+LOGIC = [
+    (1, 'a', 10, 'x'),
+    (1, 'b', 10, 'y'),
+    (2, 'a', 20, 'x'),
+    (3, 'c', 30, 'z'),
+    (3, None, 30, 'z'),
+    (4, 'd', None, 'w'),
+    (None, 'a', 40, 'x'),
+]
+GROUND_TRUTH = [
+    (1, 'a', 10, 'x'),
+    (2, 'b', 20, 'x'),
+    (2, 'b', 20, 'y'),
+    (3, 'c', 30, 'q'),
+    (4, 'd', 40, 'w'),
+    (None, 'a', 40, 'x'),
+]
+# 1 changed, 2 removed, 5 added (and 3 changed on the ground truth side)
+NEXT_LOGIC = [row for row in LOGIC if row[0] not in (1, 2)] + [(1, 'a', 10, 'x'), (5, 'e', 50, 'v')]
+NEXT_GROUND_TRUTH = [row for row in GROUND_TRUTH if row[0] != 3] + [(3, 'c', 30, 'z'), (5, 'e', 50, 'u')]
+
+
+class RecordingLogger:
+    def __init__(self):
+        self.records = []
+
+    def info(self, msg, extra=None):
+        self.records.append(extra)
+
+
+def run(spark, step, logic, ground_truth):
+    """
+    The (gt_match, count) of every record the step logs
+    """
+    logger = RecordingLogger()
+    cardo_context = SimpleNamespace(spark=spark, logger=logger, run_id='test')
+    step.process(cardo_context, CardoDataFrame(spark.createDataFrame(logic, COLUMNS), 'logic'),
+                 CardoDataFrame(spark.createDataFrame(ground_truth, COLUMNS), 'gt'))
+    return [(record['gt_match'], record['count']) for record in logger.records]
+
+
+@pytest.mark.parametrize('friendly_precision', [False, True])
+def test_first_run_matches_full_recompute(spark, tmp_path, friendly_precision):
+    incremental = CalculatePrecision('id', 'value', friendly_precision=friendly_precision,
+                                     state_storage=LocalResultStorage(str(tmp_path)))
+    full = CalculatePrecision('id', 'value', friendly_precision=friendly_precision)
+    assert run(spark, incremental, LOGIC, GROUND_TRUTH) == run(spark, full, LOGIC, GROUND_TRUTH)
+
+
+@pytest.mark.parametrize('friendly_precision', [False, True])
+def test_second_run_matches_full_recompute(spark, tmp_path, friendly_precision):
+    incremental = CalculatePrecision('id', 'value', friendly_precision=friendly_precision,
+                                     state_storage=LocalResultStorage(str(tmp_path)))
+    full = CalculatePrecision('id', 'value', friendly_precision=friendly_precision)
+    run(spark, incremental, LOGIC, GROUND_TRUTH)
+    assert run(spark, incremental, NEXT_LOGIC, NEXT_GROUND_TRUTH) == \
+        run(spark, full, NEXT_LOGIC, NEXT_GROUND_TRUTH)
+
+
+def test_unchanged_run_keeps_the_state(spark, tmp_path):
+    incremental = CalculatePrecision('id', 'value', state_storage=LocalResultStorage(str(tmp_path)))
+    first = run(spark, incremental, LOGIC, GROUND_TRUTH)
+    assert run(spark, incremental, LOGIC, GROUND_TRUTH) == first
+
+
+def test_multi_precision_matches_full_recompute(spark, tmp_path):
+    column_pairs = [('id', 'value'), ('other_id', 'other_value')]
+    incremental = CalculateMultiPrecision(column_pairs, state_storage=LocalResultStorage(str(tmp_path)))
+    full = CalculateMultiPrecision(column_pairs)
+    single = [CalculatePrecision(intersection_column, match_column, friendly_precision=friendly)
+              for intersection_column, match_column in column_pairs for friendly in [False, True]]
+    for logic, ground_truth in [(LOGIC, GROUND_TRUTH), (NEXT_LOGIC, NEXT_GROUND_TRUTH)]:
+        expected = run(spark, full, logic, ground_truth)
+        assert run(spark, incremental, logic, ground_truth) == expected
+        assert [record for step in single for record in run(spark, step, logic, ground_truth)] == expected
@@ -0,0 +1,126 @@
+import math
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('pyspark')
+pytest.importorskip('CardoExecutor')
+
+from CardoExecutor.Common.CardoDataFrame import CardoDataFrame
+from pyspark.sql.types import DoubleType, IntegerType, StringType, StructField, StructType
+
+from CardoML.Common.Steps.StatisticModel.maximum_likelihood import MaximumLikelihood
+
+GROUP_BY_COLS = ['key', 'sub_key']
+GRADE_COLS = ['grade', 'other_grade']
+AGGREGATIONS = {'grade': 'sum', 'other_grade': 'sum', 'name': 'concat_ws', 'amount': 'avg', 'events': 'count'}
+SCHEMA = StructType([StructField('key', StringType()), StructField('sub_key', IntegerType()),
+                     StructField('grade', DoubleType()), StructField('other_grade', DoubleType()),
+                     StructField('name', StringType()), StructField('amount', DoubleType()),
+                     StructField('events', DoubleType())])
+ROWS = [
+    ('a', 1, 0.5, 0.1, 'x', 1.0, 1.0),
+    ('a', 1, 0.2, 0.3, 'y', 2.0, None),
+    ('a', 1, 0.2, 0.0, 'x', None, 3.0),
+    ('a', 2, 1.0, 0.9, 'x', 4.0, 1.0),  # p = 1 falls back to log_value_for_ones
+    ('a', 2, None, 0.5, None, None, None),  # a null grade too
+    (None, 1, 0.4, 1.5, None, 3.0, 2.0),  # null key, p > 1
+    (None, 1, 0.4, 0.2, None, None, 2.0),
+    ('b', None, 0.99999, 0.99999, 'z', 5.0, 1.0),
+    (None, None, 0.3, None, 'w', 6.0, None),
+]
+
+
+def to_pandas(rows):
+    df = pd.DataFrame(rows, columns=SCHEMA.fieldNames())
+    df['sub_key'] = df['sub_key'].astype('Int64')
+    return df
+
+
+def by_key(records):
+    """
+    {(key, sub_key): row} with nulls (None, NaN, NA) as None and the concat_ws column as a set
+    """
+    def normalize(value):
+        return None if value is None or (not isinstance(value, str) and pd.isna(value)) else value
+
+    result = {}
+    for record in records:
+        record = {name: normalize(value) for name, value in record.items()}
+        record['name'] = set(record['name'].split(', ')) if record['name'] else set()
+        result[(record['key'], record['sub_key'])] = record
+    return result
+
+
+def spark_result(spark, cardo_context, step, rows=ROWS):
+    result = step.process(cardo_context, CardoDataFrame(spark.createDataFrame(rows, SCHEMA)))
+    return by_key(row.asDict() for row in result.dataframe.collect())
+
+
+def pandas_result(cardo_context, step, *sources):
+    result = step.process(cardo_context, *[CardoDataFrame(source) for source in sources])
+    assert result.payload_type == 'pandas'
+    return by_key(result.dataframe.to_dict('records'))
+
+
+def assert_same(expected, actual):
+    assert set(actual) == set(expected)
+    for key, expected_row in expected.items():
+        actual_row = actual[key]
+        for col in GRADE_COLS + ['amount']:
+            if expected_row[col] is None:
+                assert actual_row[col] is None, (key, col)
+            else:
+                assert actual_row[col] == pytest.approx(expected_row[col], rel=1e-9, abs=1e-12), (key, col)
+        assert actual_row['events'] == expected_row['events'], key
+        assert actual_row['name'] == expected_row['name'], key
+
+
+@pytest.mark.parametrize('log_value_for_ones', [math.log(0.00001), -800.0])
+@pytest.mark.parametrize('allow_ones', [False, True])
+def test_pandas_matches_spark(spark, cardo_context, log_value_for_ones, allow_ones):
+    step = MaximumLikelihood(GROUP_BY_COLS, GRADE_COLS, AGGREGATIONS, log_value_for_ones=log_value_for_ones,
+                             allow_ones=allow_ones)
+    assert_same(spark_result(spark, cardo_context, step), pandas_result(cardo_context, step, to_pandas(ROWS)))
+
+
+def test_pandas_matches_spark_on_many_sources(spark, cardo_context):
+    step = MaximumLikelihood(GROUP_BY_COLS, GRADE_COLS, AGGREGATIONS)
+    assert_same(spark_result(spark, cardo_context, step),
+                pandas_result(cardo_context, step, to_pandas(ROWS[:4]), to_pandas(ROWS[4:])))
+
+
+def test_null_keys_are_one_group(cardo_context):
+    step = MaximumLikelihood(GROUP_BY_COLS, GRADE_COLS, AGGREGATIONS)
+    result = pandas_result(cardo_context, step, to_pandas(ROWS))
+    assert result[(None, 1)]['events'] == 2
+    assert result[(None, None)]['name'] == {'w'}
+
+
+def test_fix_ones(cardo_context):
+    rows = [('a', 1, 1.0, 0.5, 'x', 1.0, 1.0)]
+    fixed = MaximumLikelihood(GROUP_BY_COLS, GRADE_COLS, AGGREGATIONS, log_value_for_ones=-800.0, replace_ones=0.9)
+    allowed = MaximumLikelihood(GROUP_BY_COLS, GRADE_COLS, AGGREGATIONS, log_value_for_ones=-800.0, allow_ones=True)
+    assert pandas_result(cardo_context, fixed, to_pandas(rows))[('a', 1)]['grade'] == 0.9
+    assert pandas_result(cardo_context, allowed, to_pandas(rows))[('a', 1)]['grade'] == 1.0
+
+
+def test_pre_aggregate_mixed_sources(spark, cardo_context):
+    step = MaximumLikelihood(GROUP_BY_COLS, GRADE_COLS, AGGREGATIONS, pre_aggregate=True)
+    result = step.process(cardo_context, CardoDataFrame(to_pandas(ROWS[:4])),
+                          CardoDataFrame(spark.createDataFrame(ROWS[4:], SCHEMA)))
+    assert_same(spark_result(spark, cardo_context, MaximumLikelihood(GROUP_BY_COLS, GRADE_COLS, AGGREGATIONS)),
+                by_key(row.asDict() for row in result.dataframe.collect()))
+
+
+def test_first_and_last_skip_nulls(cardo_context):
+    """
+    Unlike spark's, where the order of the rows after the shuffle picks the value, and nulls are kept
+    """
+    step = MaximumLikelihood(GROUP_BY_COLS, ['grade'], {'grade': 'sum', 'name': 'first', 'amount': 'last'})
+    result = step.process(cardo_context, CardoDataFrame(to_pandas(ROWS)))
+    rows = {(row['key'], row['sub_key']): row for row in result.dataframe.to_dict('records')}
+    assert rows[('a', 1)]['name'] == 'x'
+    assert rows[('a', 1)]['amount'] == 2.0  # the last row of the group has no amount
+    assert rows[('a', 2)]['name'] == 'x'
+    assert rows[('a', 2)]['amount'] == 4.0
@@ -0,0 +1,25 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def spark():
+    pyspark_sql = pytest.importorskip('pyspark.sql')
+    session = pyspark_sql.SparkSession.builder \
+        .master('local[*]') \
+        .appName('CardoMLTests') \
+        .config('spark.sql.shuffle.partitions', '4') \
+        .config('spark.ui.enabled', 'false') \
+        .getOrCreate()
+    yield session
+    session.stop()
+
+
+@pytest.fixture(scope='session')
+def cardo_context(spark):
+    """
+    The parts of a CardoContext the steps under test use
+    """
+    return SimpleNamespace(spark=spark, logger=logging.getLogger('CardoMLTests'), run_id='test')